@@ -3,20 +3,29 @@ To do:
     - Add subsections to list
     - Add section links/references
 """
+import io
 import json
+import sys
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from matplotlib.figure import Figure
 from mdutils.mdutils import MdUtils
 from pathlib import Path
-from typing import Dict, Optional, Union, List
-from .tools.utils import is_file_type, FIGURE_FOLDER
+from typing import Dict, Optional, TextIO, Tuple, Union, List
+from .tools.utils import is_file_type, resolve_strings, share_repeated_strings, split_file_name, split_heading, FIGURE_FOLDER, WRITE_BUFFER_SIZE, COMPACT_JSON
 from .tools.sections import *
+try:
+    import orjson   # Optional, faster json encoding and decoding
+except ImportError:
+    orjson = None
 
 
 class MDGenerator(Section):
     """
     Markdown Generator class to generate markdown files.
     """
-    def __init__(self, save_path: Optional[Union[str,Path]] = None, file_name:str = "GeneratedMD", title:Optional[str] = None, author:Optional[Union[str,List[str]]] = None, dpi:Optional[int] = None):
+    __slots__ = ("save_path", "file_name", "title", "author", "dpi", "figure_executor", "pending_figures", "section_headers",
+                 "section_type_count", "compress_level", "image_format", "owns_figure_executor")
+    def __init__(self, save_path: Optional[Union[str,Path]] = None, file_name:str = "GeneratedMD", title:Optional[str] = None, author:Optional[Union[str,List[str]]] = None, dpi:Optional[int] = None, figure_workers:Optional[int] = None, compress_level:Optional[int] = None, figure_executor:Optional[Executor] = None, image_format:str = "png"):
         """
         Initialize the markdown generator.
 
@@ -24,22 +33,35 @@ class MDGenerator(Section):
             save_path (Optional[Union[str,Path]], optional): Path to save the generated file. If None, the current working directory is used.
             file_name (str, optional): Name of the generated file. Defaults to "GeneratedMD".
             title (str, optional): Title of the document. Defaults to None.
-            author (str, optional): Author of the document. Defaults to None.
+            author (Union[str,List[str]], optional): Author or authors of the document. Defaults to None.
             dpi (int, optional): DPI of the generated image. Defaults to None, figures dpi.
+            figure_workers (int, optional): Number of threads used to save figures in the background. Defaults to None.
+                - If None, figures are saved when they are added.
+                - Otherwise, figures must not be changed until the markdown or json file is saved.
+            compress_level (int, optional): zlib compression level (0-9) of the saved figures. Defaults to None, matplotlib's level.
+                - Lower levels write larger files faster, e.g. 1 for reports with many figures.
+            figure_executor (Executor, optional): Executor used to save figures in the background instead of figure_workers threads. Defaults to None.
+                - A ProcessPoolExecutor saves figures on several cores. Figures are pickled when added, so they can be changed afterwards.
+                - A ThreadPoolExecutor saves the figures themselves, so like figure_workers they must not be changed until
+                  the markdown or json file is saved.
+                - The executor is not shut down by close().
+            image_format (str, optional): File format of the saved figures, such as "png" or "svg". Defaults to "png".
+                - svg files are usually smaller and faster to write for line plots, and stay sharp when zoomed.
         """
         if save_path is None:
             self.save_path = Path.cwd()
         elif isinstance(save_path, str):
-            if is_file_type(save_path):
-                file_name = ".".join(save_path.split("/")[-1].split(".")[:-1])
-                save_path = "/".join(save_path.split("/")[:-1])
             self.save_path = Path(save_path)
+            if is_file_type(save_path):
+                file_name = self.save_path.stem
+                self.save_path = self.save_path.parent
         elif isinstance(save_path, Path):
             self.save_path = save_path
         else:
             raise TypeError("save_path must be a str or Path object")
 
-        self.save_path.mkdir(parents=True, exist_ok=True)
+        if not self.save_path.is_dir():     # One stat in the common case that the folder already exists
+            self.save_path.mkdir(parents=True, exist_ok=True)
 
         self.file_name = file_name
         if title is None:
@@ -49,25 +71,38 @@ class MDGenerator(Section):
         if author is None:
             self.author = ""
         else:
-            if isinstance(author, list):
+            if isinstance(author, (list, tuple)) and len(author) != 1:
                 self.author = "Authors: " + ", ".join(author)
+            elif isinstance(author, (list, tuple)):
+                self.author = f"Author: {author[0]}"
             else:
                 self.author = f"Author: {author}"
         
         self.dpi = dpi  # Store dpi for the figures
+        self.compress_level = compress_level
+        self.image_format = image_format.lower()
+        self.owns_figure_executor = figure_executor is None and figure_workers is not None    # Only shut down our own threads
+        self.figure_executor = ThreadPoolExecutor(max_workers=figure_workers) if self.owns_figure_executor else figure_executor
+        self.pending_figures:List[Tuple[Figure,Future]] = []
         
         mdFile = MdUtils(file_name=str(self.save_path / (file_name + ".md")), title=self.title, author=self.author)
-        self.section_headers:List[str] = []
+        self.section_headers:Dict[str,Section] = {}     # Every section by its header location, in the order they were added
         self.section_type_count:Dict[SectionType,int] = SectionType.new_dictionary(SectionType)
         
         # Set the class variables for the Section class
         Section.save_path = self.save_path
         Section.dpi = self.dpi
+        Section.compress_level = self.compress_level
+        Section.image_format = self.image_format
+        Section.figure_folder = None
+        Section.figure_executor = self.figure_executor
+        Section.pending_figures = self.pending_figures
         Section.section_headers = self.section_headers
         Section.section_type_count = self.section_type_count
 
         # Initialize the Parent Section class
         Section.__init__(self, mdFile)
+        self.section_paths = {}
 
     def section_search(self, key:str) -> Section:
         """
@@ -77,16 +112,9 @@ class MDGenerator(Section):
             key (str): Key to search for.
 
         Returns:
-            Optional[BaseSection]: Section with the given key.
+            Section: Section with the given key, created if it does not exist.
         """
-        if len(key) > 0 and key[0] == "/":
-            key = key[1:]
-        keys = key.split("/")
-        
-        ptr = self
-        for k in keys:
-            ptr = ptr[k]
-        return ptr
+        return self.find_section(split_heading(key))
             
     def add_text(self, header:Optional[str]=None, text:str="\n") -> BaseSection:
         """
@@ -96,11 +124,7 @@ class MDGenerator(Section):
             header (str): Header of the section.
             text (str): Text of the section.
         """
-        if header is None:
-            super().add_text(text)
-        else:
-            section:Section = self.section_search(header)
-            section.add_text(text)
+        return Section.add_text(self if header is None else self.section_search(header), text)
 
     def add_code(self, header:Optional[str]=None, code:str="\n") -> BaseSection:
         """
@@ -110,26 +134,19 @@ class MDGenerator(Section):
             header (str): Header of the section.
             code (str): Code of the section.
         """
-        if header is None:
-            super().add_code(code)
-        else:
-            section:Section = self.section_search(header)
-            section.add_code(code)
+        return Section.add_code(self if header is None else self.section_search(header), code)
 
-    def add_image(self, header:Optional[str]=None, fig:Union[Figure,str]="", caption:str="") -> BaseSection:
+    def add_image(self, header:Optional[str]=None, fig:Union[Figure,str,bytes]="", caption:str="", embed:bool=False) -> BaseSection:
         """
         Add an image section to the markdown file.
 
         Args:
             header (str): Header of the section.
-            fig (Figure): Figure to add to the section.
+            fig (Figure): Figure to add to the section, path to an image file, or contents of an image file.
             caption (str): Caption of the section.
+            embed (bool): Embed the figure in the markdown file instead of saving it in the figure folder.
         """
-        if header is None:
-            super().add_image(fig, caption)
-        else:
-            section:Section = self.section_search(header)
-            section.add_image(fig, caption)
+        return Section.add_image(self if header is None else self.section_search(header), fig, caption, embed)
 
     def add_list(self, header:Optional[str]=None, items:List[str]=[], marked_with:str="-") -> BaseSection:
         """
@@ -139,11 +156,7 @@ class MDGenerator(Section):
             header (str): Header of the section.
             items (List[str]): Items of the section.
         """
-        if header is None:
-            super().add_list(items, marked_with)
-        else:
-            section:Section = self.section_search(header)
-            section.add_list(items, marked_with)
+        return Section.add_list(self if header is None else self.section_search(header), items, marked_with)
 
     def add_link(self, header:Optional[str]=None, link:str="", text:str="") -> BaseSection:
         """
@@ -154,11 +167,7 @@ class MDGenerator(Section):
             link (str): Link of the section.
             text (str): Text of the section.
         """
-        if header is None:
-            super().add_link(link, text)
-        else:
-            section:Section = self.section_search(header)
-            section.add_link(link, text)
+        return Section.add_link(self if header is None else self.section_search(header), link, text)
 
     def add_checkbox(self, header:Optional[str]=None, items:List[str]=[], checked:List[bool]=[]) -> BaseSection:
         """
@@ -169,19 +178,47 @@ class MDGenerator(Section):
             items (List[str]): Items of the section.
             checked (List[bool]): Checked status of the items.
         """
-        if header is None:
-            super().add_checkbox(items, checked)
-        else:
-            section:Section = self.section_search(header)
-            section.add_checkbox(items, checked)
+        return Section.add_checkbox(self if header is None else self.section_search(header), items, checked)
+
+    def get_md_text(self) -> str:
+        """
+        Render the markdown file to a string without writing it. Figures still being saved in the background are
+        not waited for, since the text only refers to their paths.
+
+        Returns:
+            str: Markdown text of the file.
+        """
+        buf = io.StringIO()
+        buf.write(self.mdFile.title + self.mdFile.table_of_contents + self.mdFile.file_data_text)
+        self.render_subsections_to(buf, level=1)
+        buf.write(self.mdFile.reference.get_references_as_markdown())
+        return buf.getvalue()
 
     def render(self) -> None:
         """
         Render the markdown file.
         """
-        for section in self.values():
-            section.render()
-        self.mdFile.create_md_file()
+        self.wait_for_figures()
+
+        # Write the whole file through one large buffer instead of MdUtils' truncate and reopen
+        with open(self.mdFile.file_name, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(self.get_md_text())
+
+    def wait_for_figures(self) -> None:
+        """
+        Wait for the figures being saved in the background to be written.
+        """
+        for _, future in self.pending_figures:
+            future.result()
+        self.pending_figures.clear()
+
+    def close(self) -> None:
+        """
+        Wait for the figures being saved and shut down the background threads started for figure_workers.
+        """
+        self.wait_for_figures()
+        if self.owns_figure_executor:
+            self.figure_executor.shutdown()
 
     def is_valid(self) -> bool:
         """
@@ -190,10 +227,7 @@ class MDGenerator(Section):
         Returns:
             bool: True if the markdown file is valid, False otherwise.
         """
-        for section in self.values():
-            if not section.is_valid():
-                return False
-        return True
+        return all(section.is_valid() for section in self.values())
     
     def save(self, file_name:Optional[str] = None) -> None:
         """
@@ -204,11 +238,9 @@ class MDGenerator(Section):
                 - If None, the current file name is used.
         """
         if file_name is not None:
-            if len(file_name.split("/")) > 1:
-                self.save_path = Path("/".join(file_name.split("/")[:-1]))
-                self.file_name = file_name.split("/")[-1]
-            if file_name.split(".")[-1] == "md":
-                self.file_name = ".".join(file_name.split(".")[:-1])
+            directory, self.file_name = split_file_name(file_name, "md")
+            if directory is not None:
+                self.save_path = Path(directory)
 
             self.mdFile.file_name = str(self.save_path / (self.file_name + ".md"))
 
@@ -224,43 +256,94 @@ class MDGenerator(Section):
         json_dict = {}
 
         # Add settings
-        json_dict["MDG_Settings"] = {
+        json_dict["MDG_Settings"] = self._settings_json()
+
+        json_dict.update(Section._to_json(self))
+        return json_dict
+
+    def _settings_json(self) -> Dict:
+        """
+        Get the settings of the markdown file as a dictionary.
+
+        Returns:
+            Dict: Dictionary of the settings needed to reload the markdown file.
+        """
+        return {
             "save_path": str(self.save_path),
             "file_name": self.file_name,
             "title": self.title,
             "author": self.author,
             "dpi": self.dpi,
-            "section_headers": self.section_headers,
+            "section_headers": list(self.section_headers),
             "section_type_count": self.section_type_count
         }
 
+    def _stream_json(self, fp:TextIO) -> None:
+        """
+        Write the compact json representation of the markdown file one top level section at a time, without
+        building the dictionary for the whole file.
+
+        Args:
+            fp (TextIO): File object to write the json to.
+        """
+        fp.write('{"MDG_Settings":')
+        json.dump(self._settings_json(), fp, **COMPACT_JSON)
         for key, value in self.items():
-            json_dict[key] = value._to_json()
-        return json_dict
+            fp.write(f",{json.dumps(key, ensure_ascii=False)}:")
+            json.dump(value._to_json(), fp, **COMPACT_JSON)
+        fp.write("}")
+
+    def get_json_path(self, file_name:Optional[str] = None) -> str:
+        """
+        Get the path of a json file of the markdown file.
 
-    def save_json(self, file_name:Optional[str] = None) -> None:
+        Args:
+            file_name (Optional[str], optional): Name of the json file, optionally with a directory. Defaults to None.
+                - If None, the name of the markdown file is used.
+                - Without a directory, the file is in the save path.
+
+        Returns:
+            str: Path to the json file.
+        """
+        if file_name is None:
+            return str(self.save_path / (self.file_name + ".json"))
+        directory, file_name = split_file_name(file_name, "json")
+        save_path = self.save_path if directory is None else Path(directory)
+        return str(save_path / (file_name + ".json"))
+
+    def save_json(self, file_name:Optional[str] = None, compact:bool = False, share_strings:bool = False) -> None:
         """
         Save the markdown file as a json file.
 
         Args:
             file_name (Optional[str], optional): Name of the json file. Defaults to None.
                 - If None, the file is saved as "GeneratedMD.json".
+            compact (bool, optional): Write the json without indentation or whitespace. Defaults to False.
+                - Compact files are smaller and faster to write, and load the same way.
+                - Non-ascii text is written as utf-8 instead of being escaped.
+                - Written with orjson when it is installed.
+            share_strings (bool, optional): Store text, code and captions used more than once only once. Defaults to False.
+                - Useful for documents with repeated boilerplate. The file loads the same way.
         """
-        if file_name is not None:
-            if len(file_name.split("/")) > 1:
-                save_path = Path("/".join(file_name.split("/")[:-1]))
-                file_name = file_name.split("/")[-1]
+        self.wait_for_figures()
+        json_path = self.get_json_path(file_name)
+        json_dict = None
+        if share_strings:
+            json_dict, strings = share_repeated_strings(self._to_json())
+            json_dict["MDG_Strings"] = strings
+
+        if compact and orjson is not None:
+            with open(json_path, "wb") as f:
+                f.write(orjson.dumps(self._to_json() if json_dict is None else json_dict, option=orjson.OPT_NON_STR_KEYS))
+            return
+
+        with open(json_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            if json_dict is not None:
+                json.dump(json_dict, f, **(COMPACT_JSON if compact else {"indent": 4}))
+            elif compact:
+                self._stream_json(f)
             else:
-                save_path = self.save_path
-
-            if file_name.split(".")[-1] == "json":
-                file_name = ".".join(file_name.split(".")[:-1])
-        else:
-            save_path = self.save_path
-            file_name = self.file_name
-
-        with open(str(save_path / (file_name + ".json")), "w") as f:
-            json.dump(self._to_json(), f, indent=4)
+                json.dump(self._to_json(), f, indent=4)
 
     def load_json(self, file_name:Optional[str] = None) -> None:
         """
@@ -270,33 +353,31 @@ class MDGenerator(Section):
             file_name (Optional[str], optional): Name of the json file. Defaults to None.
                 - If None, the file is loaded as "GeneratedMD.json".
         """
-        if file_name is not None:
-            if len(file_name.split("/")) > 1:
-                save_path = Path("/".join(file_name.split("/")[:-1]))
-                file_name = file_name.split("/")[-1]
-            else:
-                save_path = self.save_path
-
-            if file_name.split(".")[-1] == "json":
-                file_name = ".".join(file_name.split(".")[:-1])
+        if orjson is not None:
+            with open(self.get_json_path(file_name), "rb") as f:
+                json_dict = orjson.loads(f.read())
         else:
-            save_path = self.save_path
-            file_name = self.file_name
-
-        with open(str(save_path / (file_name + ".json")), "r") as f:
-            json_dict = json.load(f)
+            with open(self.get_json_path(file_name), "r", encoding="utf-8") as f:
+                json_dict = json.load(f)
+        if "MDG_Strings" in json_dict:
+            json_dict = resolve_strings(json_dict, json_dict.pop("MDG_Strings"))
         
         self.save_path = Path(json_dict["MDG_Settings"]["save_path"])
         self.file_name = json_dict["MDG_Settings"]["file_name"]
         self.title = json_dict["MDG_Settings"]["title"]
         self.author = json_dict["MDG_Settings"]["author"]
         self.dpi = json_dict["MDG_Settings"]["dpi"]
-        self.section_headers = json_dict["MDG_Settings"]["section_headers"]
+        self.section_headers = dict.fromkeys(map(sys.intern, json_dict["MDG_Settings"]["section_headers"]))   # Filled in as the sections are loaded
         self.section_type_count = SectionType.new_dictionary(SectionType)
 
         # Set the class variables for the Section class
         Section.save_path = self.save_path
         Section.dpi = self.dpi
+        Section.compress_level = self.compress_level
+        Section.image_format = self.image_format
+        Section.figure_folder = None
+        Section.figure_executor = self.figure_executor
+        Section.pending_figures = self.pending_figures
         Section.section_headers = self.section_headers
         Section.section_type_count = self.section_type_count
 
@@ -307,31 +388,11 @@ class MDGenerator(Section):
                     self[key]._from_json(value)
                 else:       # It is not a Section Object
                     if isinstance(value, dict):
-                        value_type = list(value.keys())[0]
-                        if value_type == "text":
-                            self.add_text(None, value["text"])
-                        elif value_type == "code":
-                            self.add_code(None, value["code"], value["language"])
-                        elif value_type == "image":
-                            self.add_image(None, value["image"], value["caption"])
-                        elif value_type == "table":
-                            self.add_table(None, value["table"], value["columns"], value["rows"])
-                        elif value_type == "list":
-                            self.add_list(None, value["list"])
-                        elif value_type == "link":
-                            self.add_link(None, value["link"], value["text"])
-                        elif value_type == "checkbox":
-                            self.add_checkbox(None, value["text_list"], value["checked"])
+                        loader = JSON_LOADERS.get(next(iter(value), None))
+                        if loader is not None:
+                            loader(self, value)
                     else:
                         raise ValueError(f"Value for key {key} is not a dictionary.")
-        
-        # Remove duplicate section headers
-        i = 0
-        while i < len(self.section_headers):
-            if self.section_headers[i] in self.section_headers[:i]:
-                self.section_headers.pop(i)
-            else:
-                i += 1
 
 
 
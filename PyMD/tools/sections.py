@@ -1,13 +1,28 @@
+import io
+import os
+import pickle
+import sys
 from abc import ABC, abstractmethod
-from collections import UserDict
+from collections import Counter
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from enum import IntEnum
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
 from matplotlib.figure import Figure
 from mdutils.mdutils import MdUtils
+from mdutils.tools.MDList import MDList
+from mdutils.tools.Table import Table
+from mdutils.tools.TextUtils import TextUtils
 import numpy as np
-from pandas import DataFrame
-from .utils import FIGURE_FOLDER
+from .utils import FIGURE_FOLDER, get_base_name, image_data_uri, is_dataframe, split_heading
+if TYPE_CHECKING:
+    from pandas import DataFrame    # Only imported by the user, which keeps pandas out of the import time
+else:
+    DataFrame = Any     # Lets typing.get_type_hints resolve the annotations without importing pandas
+
+NEW_LINE = "  \n"   # Text MdUtils.new_line writes for an empty line
+BASE_SLOTS = ("mdFile", "location", "parent")    # Attributes set by BaseSection.__init__
 
 
 class SectionType(IntEnum):
@@ -23,28 +38,59 @@ class SectionType(IntEnum):
     CHECKBOX = 6
 
     def new_dictionary(self) -> Dict:
-        return {self.TEXT: 0, self.CODE: 0, self.IMAGE: 0, self.TABLE: 0, self.LIST: 0, self.LINK: 0, self.CHECKBOX: 0}
+        return dict.fromkeys(SECTION_TYPE_MEMBERS, 0)
 
     def __str__(self):
-        return self.name.lower()
+        return SECTION_TYPE_NAMES[self]
+
+
+SECTION_TYPE_MEMBERS:Tuple[SectionType,...] = tuple(SectionType)    # Iterated once, reused for every count dictionary
+SECTION_TYPE_NAMES:Dict[SectionType,str] = {section_type: section_type.name.lower() for section_type in SECTION_TYPE_MEMBERS}  # Enum .name is a slow descriptor
 
 
 class BaseSection(ABC):
     """
     Abstract class for a section in the markdown report. All types of sections must inherit from this class.
     """
+    __slots__ = ()  # Subclasses declare BASE_SLOTS themselves, since Section can't also derive from dict with them here
+    is_container:bool = False   # True for sections holding other sections, checked instead of an ABC isinstance
+    section_type:Optional[SectionType] = None   # Type used to name and count a leaf section, inherited by subclasses
     def __init__(self, mdFile: MdUtils, location:str):
         self.mdFile = mdFile
         self.location = location
+        self.parent:Optional["Section"] = None    # Section holding this section, set when it is added
 
-    @abstractmethod
     def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
         """
         Render the section in the markdown file. This section should include all the pre-processing required to render
         followed by a call to some MdUtils methods to render the section.
 
         Example MdUtils methods: new_header, new_paragraph, new_inline_image, insert_code, etc.
+
+        By default, the text written by render_to is appended to the markdown file.
+        """
+        buf = io.StringIO()
+        self.render_to(buf, level=level, space_above=space_above, space_below=space_below)
+        self.mdFile.file_data_text += buf.getvalue()
+
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         """
+        Write the markdown text of the section to the buffer. Sections must override either this method or render.
+        If only render is overridden, the section is rendered with the MdUtils methods and the text it added to the
+        markdown file is moved into the buffer.
+
+        Args:
+            buf (io.StringIO): Buffer to write the markdown text to.
+            level (int, optional): Header level of the section. Defaults to 1.
+            space_above (bool, optional): Add an empty line above the section. Defaults to False.
+            space_below (bool, optional): Add an empty line below the section. Defaults to True.
+        """
+        if type(self).render is BaseSection.render:
+            raise NotImplementedError(f"{type(self).__name__} must implement render or render_to.")
+        start = len(self.mdFile.file_data_text)
+        self.render(level=level, space_above=space_above, space_below=space_below)
+        buf.write(self.mdFile.file_data_text[start:])
+        self.mdFile.file_data_text = self.mdFile.file_data_text[:start]
 
     @abstractmethod
     def is_valid(self) -> bool:
@@ -53,14 +99,21 @@ class BaseSection(ABC):
         during rendering.
         """
 
-class Section(BaseSection, UserDict):
+class Section(BaseSection, dict):
     """
     Section to hold multiple sections in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("header", "header_location", "section_count", "path", "section_paths")
+    is_container:bool = True
     save_path:Path = None
     dpi:int = None
-    section_headers:List[str] = None
+    compress_level:Optional[int] = None
+    image_format:str = "png"
+    section_headers:Dict[str,"Section"] = None
     section_type_count:Dict[SectionType,int] = None
+    figure_folder:Optional[str] = None  # Figure folder of the current save_path with a trailing separator, set once it exists
+    figure_executor:Optional[Executor] = None
+    pending_figures:List[Tuple[Figure,Future]] = None
 
     def __init__(self, mdFile: MdUtils, header:Optional[str] = None, location:Optional[str] = None):
         """
@@ -71,20 +124,15 @@ class Section(BaseSection, UserDict):
             header (Optional[str], optional): Heading of the section. Defaults to None.
             location (Optional[str], optional): Location of the section. Defaults to None.
         """
-        UserDict.__init__(self)
+        dict.__init__(self)
         BaseSection.__init__(self, mdFile, location)
         self.header = header
+        self.header_location:Optional[str] = header if not location or header is None else location + '/' + header
         if header is not None:
-            self.section_headers.append(self.get_header_location())
-        self.base_name = mdFile.file_name.split("/")[-1].split(".")[0]
-
-        self.text:int = 0
-        self.code:int = 0
-        self.image:int = 0
-        self.table:int = 0
-        self.list:int = 0
-        self.link:int = 0
-        self.checkbox:int = 0
+            self.section_headers[self.header_location] = self
+        self.section_count:Counter = Counter()    # Number of each type of section added directly to this section
+        self.path:Tuple[str, ...] = ()     # Headers from the top of the markdown file down to this section
+        self.section_paths:Optional[Dict[Tuple[str, ...], Section]] = None    # Every section of the file by path, shared by the whole tree
     
     def _from_json(self, json_dict:Dict) -> None:
         """
@@ -93,29 +141,16 @@ class Section(BaseSection, UserDict):
         Args:
             json_dict (Dict): Dictionary representation of the markdown file.
         """
-        location = self.get_header_location()
-        relative_headers = [x.replace(location + "/", "") for x in self.section_headers if x.startswith(location + "/")]
+        prefix = self.header_location + "/"
 
         for key, value in json_dict.items():
-            if key in relative_headers:
-                self[key]._from_json(value)
+            if prefix + key in self.section_headers:   # It is a subsection, looked up directly instead of scanning every header
+                self.get_subsection(key)._from_json(value)
             else:
                 if isinstance(value, dict):
-                    value_type = list(value.keys())[0]
-                    if value_type == "text":
-                        self.add_text(value["text"])
-                    elif value_type == "code":
-                        self.add_code(value["code"], value["language"])
-                    elif value_type == "image_path":
-                        self.add_image(value["image_path"], value["caption"])
-                    elif value_type == "table":
-                        self.add_table(value["table"], value["columns"], value["rows"])
-                    elif value_type == "items":
-                        self.add_list(value["items"])
-                    elif value_type == "link":
-                        self.add_link(value["link"], value["text"])
-                    elif value_type == "text_list":
-                        self.add_checkbox(value["text_list"], value["checked"])
+                    loader = JSON_LOADERS.get(next(iter(value), None))
+                    if loader is not None:
+                        loader(self, value)
                 else:
                     raise ValueError(f"Value for key {key} is not a dictionary.")
 
@@ -127,58 +162,190 @@ class Section(BaseSection, UserDict):
         Returns:
             Dict: Dictionary representation of the markdown file.
         """
-        json_dict = {}
-        for key, value in self.items():
-            json_dict[key] = value._to_json()
-        return json_dict
+        return {key: value._to_json() for key, value in self.items()}
+
+    def set_subsection(self, key:str, section:BaseSection) -> None:
+        """
+        Set the direct subsection with the given header. Unlike indexing, the key is used as is and is not split
+        into a path.
+
+        Args:
+            key (str): Header of the subsection.
+            section (BaseSection): Section to set.
+        """
+        old_section = dict.get(self, key)
+        if old_section is not None and old_section.is_container and old_section is not section:
+            old_section.forget()
+        dict.__setitem__(self, key, section)
+        section.parent = self
+        if section.is_container:
+            section.set_path(self.path + (key,), self.section_paths)
+
+    def set_path(self, path:Tuple[str, ...], section_paths:Optional[Dict[Tuple[str, ...], "Section"]]) -> None:
+        """
+        Move this section and every section below it to a new path, so a section that already has subsections can be
+        placed anywhere in the markdown file. The locations and header locations of the moved sections follow the
+        new path.
 
-    def get_section_ptr(self, keys:List[str]) -> BaseSection:
+        Args:
+            path (Tuple[str, ...]): Headers from the top of the markdown file down to this section.
+            section_paths (Optional[Dict[Tuple[str, ...], Section]]): Every section of the file by path.
+        """
+        if self.section_paths is not None and self.section_paths.get(self.path) is self:
+            del self.section_paths[self.path]
+        self.path = path
+        self.section_paths = section_paths
+        if section_paths is not None:
+            section_paths[path] = self
+
+        # The header location is rebuilt from the key in the new parent, so the json keys find the section again
+        location = self.parent.header_location if self.parent is not None else self.location
+        header_location = path[-1] if not location else location + "/" + path[-1]
+        section_headers = self.section_headers
+        if section_headers is not None and section_headers.get(header_location) is not self:
+            if section_headers.get(self.header_location) is self:
+                del section_headers[self.header_location]
+            section_headers[header_location] = self
+        self.location = location
+        self.header_location = header_location
+        for key, section in self.items():
+            if section.is_container:
+                section.set_path(path + (key,), section_paths)
+            else:
+                section.location = header_location
+
+    def forget(self) -> None:
+        """
+        Remove this section and every section below it from the section headers and paths of the markdown file.
+        """
+        location = self.header_location
+        if self.section_headers is not None and self.section_headers.get(location) is self:
+            del self.section_headers[location]
+        if self.section_paths is not None and self.section_paths.get(self.path) is self:
+            del self.section_paths[self.path]
+        for section in self.values():
+            if section.is_container:
+                section.forget()
+
+    def find_section(self, keys:Tuple[str, ...]) -> BaseSection:
+        """
+        Get the section at the path of headers below this section, creating the missing sections. Sections that
+        already exist are found with a single lookup instead of walking down the tree.
+
+        Args:
+            keys (Tuple[str, ...]): Header of each level below this section.
+
+        Returns:
+            BaseSection: Section at the path.
+        """
+        if self.section_paths is not None:
+            section = self.section_paths.get(self.path + keys if self.path else keys)
+            if section is not None:
+                return section
         ptr = self
-        for k in keys[:-1]:
-            ptr = ptr[k]
-        return ptr, keys[-1]
+        for key in keys:    # Walk down the subheadings, creating the missing sections
+            ptr = ptr.get_subsection(key)
+        return ptr
+
+    def get_section_ptr(self, keys:Tuple[str, ...]) -> Tuple[BaseSection, str]:
+        return self.find_section(keys[:-1]), keys[-1]
+
+    def get_subsection(self, key:str) -> BaseSection:
+        """
+        Get the direct subsection with the given header, creating an empty section if it does not exist. Unlike
+        indexing, the key is used as is and is not split into a path.
+
+        Args:
+            key (str): Header of the subsection.
+
+        Returns:
+            BaseSection: Subsection with the given header.
+        """
+        section = dict.get(self, key)
+        if section is None:
+            key = sys.intern(key)
+            section = Section(self.mdFile, key, self.header_location)
+            self.set_subsection(key, section)
+        return section
 
     def __setitem__(self, key:str, section:Union[BaseSection, str, DataFrame, np.ndarray, Figure, List[str]]):
-        if len(key) > 0 and key[0] == "/":
-            key = key[1:]
-        keys = key.split("/")
-        
-        if len(keys) > 1:
-            ptr, new_key = self.get_section_ptr(keys)
-            return ptr.__setitem__(new_key, section)
+        if "/" in key:  # Headers without a path, the common case, skip splitting
+            keys = split_heading(key)
+            if len(keys) > 1:
+                ptr, new_key = self.get_section_ptr(keys)
+                return ptr.__setitem__(new_key, section)
+            key = keys[0]
+
+        if isinstance(section, BaseSection):
+            return self.set_subsection(key, section)
+        elif isinstance(section, str):
+            self.get_subsection(key).add_text(section)
+        elif is_dataframe(section):
+            self.get_subsection(key).add_table(section)
+        elif isinstance(section, np.ndarray):
+            self.get_subsection(key).add_table(section)
+        elif isinstance(section, Figure):
+            self.get_subsection(key).add_image(section)
+        elif isinstance(section, list):
+            self.get_subsection(key).add_list(section)
         else:
-            if isinstance(section, BaseSection):
-                return super().__setitem__(key, section)
-            elif isinstance(section, str):
-                self[key].add_text(section)
-            elif isinstance(section, DataFrame):
-                self[key].add_table(section)
-            elif isinstance(section, np.ndarray):
-                self[key].add_table(section)
-            elif isinstance(section, Figure):
-                self[key].add_image(section)
-            elif isinstance(section, list):
-                self[key].add_list(section)
-            else:
-                raise ValueError("Invalid section type.")
+            raise ValueError("Invalid section type.")
     
     def __getitem__(self, key:str) -> BaseSection:
-        if len(key) > 0 and key[0] == "/":
-            key = key[1:]
-        keys = key.split("/")
-        if len(keys) > 1:
-            ptr, new_key = self.get_section_ptr(keys)
-            return ptr.__getitem__(new_key)
-        else:
-            if key not in self:
-                self[key] = Section(self.mdFile, key, self.get_header_location())
-            return super().__getitem__(key)
+        if "/" in key:
+            keys = split_heading(key)
+            if len(keys) > 1:
+                ptr, new_key = self.get_section_ptr(keys)
+                return ptr.__getitem__(new_key)
+            key = keys[0]
+        return self.get_subsection(key)
     
-    def __delitem__(self, key: str) -> None:     # Need to make this delete all strings with key in it
-        if self.section_headers is not None and key in self.section_headers:
-            self.section_headers.remove(key)
+    def __delitem__(self, key: str) -> None:
+        if "/" in key:
+            keys = split_heading(key)
+            if len(keys) > 1:   # Deleting never creates sections, so a missing parent is a KeyError
+                ptr = self
+                for parent_key in keys[:-1]:
+                    ptr = dict.__getitem__(ptr, parent_key)
+                return ptr.__delitem__(keys[-1])
+            key = keys[0]
+        section = dict.get(self, key)
+        if section is not None and section.is_container:
+            section.forget()
         return super().__delitem__(key)
-    
+
+    # The dict methods below would otherwise skip __setitem__ and __delitem__, leaving raw values in the tree or
+    # removed sections in the section headers and paths
+    def update(self, *args, **kwargs) -> None:
+        for key, section in dict(*args, **kwargs).items():
+            self[key] = section
+
+    def setdefault(self, key:str, default:Union[BaseSection, str, DataFrame, np.ndarray, Figure, List[str]] = None) -> BaseSection:
+        if not dict.__contains__(self, key):
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def pop(self, key:str, *default) -> BaseSection:
+        if not dict.__contains__(self, key):
+            if default:
+                return default[0]
+            raise KeyError(key)
+        section = dict.__getitem__(self, key)
+        self.__delitem__(key)
+        return section
+
+    def popitem(self) -> Tuple[str, BaseSection]:
+        key, section = dict.popitem(self)
+        if section.is_container:
+            section.forget()
+        return key, section
+
+    def clear(self) -> None:
+        for section in self.values():
+            if section.is_container:
+                section.forget()
+        dict.clear(self)
+
     def get_header_location(self) -> str:
         """
         Get the heading of the section.
@@ -186,7 +353,7 @@ class Section(BaseSection, UserDict):
         Returns:
             str: Heading of the section.
         """
-        return self.header if self.location == '' or self.location == None else self.location + '/' + self.header
+        return self.header_location
 
     def get_section_name(self, section:BaseSection) -> str:
         """
@@ -198,26 +365,10 @@ class Section(BaseSection, UserDict):
         Returns:
             str: Name of the section.
         """
-        if isinstance(section, Section):
-            name = section.header
-        elif isinstance(section, TextSection):
-            name = f"text{self.text}"
-        elif isinstance(section, CodeSection):
-            name = f"code{self.code}"
-        elif isinstance(section, ImageSection):
-            name = f"image{self.image}"
-        elif isinstance(section, TableSection):
-            name = f"table{self.table}"
-        elif isinstance(section, ListSection):
-            name = f"list{self.list}"
-        elif isinstance(section, LinkSection):
-            name = f"link{self.link}"
-        elif isinstance(section, CheckBoxSection):
-            name = f"checkbox{self.checkbox}"
-        else:
-            raise ValueError("Invalid section type.")
-        
-        return name
+        if section.is_container:
+            return section.header
+        section_type = get_section_type(section)
+        return f"{SECTION_TYPE_NAMES[section_type]}{self.section_count[section_type]}"
     
     def update_section_count(self, section:BaseSection) -> None:
         """
@@ -226,29 +377,9 @@ class Section(BaseSection, UserDict):
         Args:
             section (BaseSection): Section object to update the count for.
         """
-        if isinstance(section, TextSection):
-            self.text += 1
-            self.section_type_count[SectionType.TEXT] += 1
-        elif isinstance(section, CodeSection):
-            self.code += 1
-            self.section_type_count[SectionType.CODE] += 1
-        elif isinstance(section, ImageSection):
-            self.image += 1
-            self.section_type_count[SectionType.IMAGE] += 1
-        elif isinstance(section, TableSection):
-            self.table += 1
-            self.section_type_count[SectionType.TABLE] += 1
-        elif isinstance(section, ListSection):
-            self.list += 1
-            self.section_type_count[SectionType.LIST] += 1
-        elif isinstance(section, LinkSection):
-            self.link += 1
-            self.section_type_count[SectionType.LINK] += 1
-        elif isinstance(section, CheckBoxSection):
-            self.checkbox += 1
-            self.section_type_count[SectionType.CHECKBOX] += 1
-        else:
-            raise ValueError("Invalid section type.")
+        section_type = get_section_type(section)
+        self.section_count[section_type] += 1
+        self.section_type_count[section_type] += 1
     
     def add_section(self, heading:Optional[str], section:Optional[BaseSection] = None) -> BaseSection:
         """
@@ -260,7 +391,7 @@ class Section(BaseSection, UserDict):
                 - If None, a new Section object is created.
 
         Returns:
-            bool: True if the section was added successfully, False if the section already exists.
+            BaseSection: The added section, or the section at the heading if no section is given.
         """
         if heading is None: # If the heading is None, add the section to the current section
             if section is None:
@@ -268,28 +399,27 @@ class Section(BaseSection, UserDict):
             else:
                 self[self.get_section_name(section)] = section
                 return section
-        if len(heading) > 0 and heading[0] == "/":
-            heading = heading[1:]
-        headers = heading.split("/") # Split the heading into subheadings
-        head = headers[0]
-
-        if len(headers) == 1:  # If there is only one heading left, check if it is this section
-            if head not in self.keys():  # If the section does not exist, create it
-                self[head] = Section(self.mdFile, head, self.get_header_location())
-
-            if section is not None:
-                section = self[head].add_section(None, section)
-            else:
-                section = self[head]
+        ptr = self.find_section(split_heading(heading))
+        if section is not None:
+            return ptr.add_section(None, section)
+        return ptr
+    
+    def add_leaf(self, section_type:SectionType, section:BaseSection) -> BaseSection:
+        """
+        Add a leaf section whose type is already known, skipping the type lookup and key handling of add_section.
 
-        elif len(headers) > 1:
-            if head not in self.keys():  # If the section does not exist, create it
-                self[head] = Section(self.mdFile, head, self.get_header_location())
+        Args:
+            section_type (SectionType): Type of the section.
+            section (BaseSection): Section to add to the current section.
 
-            section = self[head].add_section("/".join(headers[1:]), section)   # Recursively add the section to the next level
-        
+        Returns:
+            BaseSection: The added section.
+        """
+        self.set_subsection(f"{SECTION_TYPE_NAMES[section_type]}{self.section_count[section_type]}", section)
+        self.section_count[section_type] += 1
+        self.section_type_count[section_type] += 1
         return section
-    
+
     def add_text(self, text:str="\n") -> BaseSection:
         """
         Add a text section to the markdown file.
@@ -302,11 +432,7 @@ class Section(BaseSection, UserDict):
         Returns:
             BaseSection: Text section object.
         """
-        section = self.add_section(None, TextSection(self.mdFile, self.get_header_location(), text))
-        if section is not None:
-            self.text += 1
-            self.section_type_count[SectionType.TEXT] += 1
-        return section
+        return self.add_leaf(SectionType.TEXT, TextSection(self.mdFile, self.header_location, text))
     
     def add_code(self, code:str="\t", language:str="python") -> BaseSection:
         """
@@ -319,18 +445,14 @@ class Section(BaseSection, UserDict):
         Returns:
             BaseSection: Code section object.
         """
-        section = self.add_section(None, CodeSection(self.mdFile, self.get_header_location(), code, language))
-        if section is not None:
-            self.code += 1
-            self.section_type_count[SectionType.CODE] += 1
-        return section
+        return self.add_leaf(SectionType.CODE, CodeSection(self.mdFile, self.header_location, code, language))
     
-    def add_figure(self, figure:Union[Figure,str], caption:str=None) -> BaseSection:
+    def add_figure(self, figure:Union[Figure,str,bytes], caption:Optional[str]=None) -> BaseSection:
         """
         Add a figure section to the markdown file.
 
         Args:
-            figure (Union[Figure,str]): Figure object or path to the figure file.
+            figure (Union[Figure,str,bytes]): Figure object, path to the figure file, or contents of an image file.
             caption (str, optional): Caption for the figure. Defaults to None.
 
         Returns:
@@ -338,31 +460,54 @@ class Section(BaseSection, UserDict):
         """
         return self.add_image(figure, caption)
     
-    def add_image(self, figure:Union[Figure,str], caption:str=None) -> BaseSection:
+    def add_image(self, figure:Union[Figure,str,bytes], caption:Optional[str]=None, embed:bool=False) -> BaseSection:
         """
         Add an image section to the markdown file.
 
         Args:
-            image_path (str): Path to the image file.
+            figure (Union[Figure,str,bytes]): Figure to save, path to the image file, or contents of an image file.
+                - The contents of an image file are embedded in the markdown file. They must be a png, jpeg, gif or svg file.
             caption (str, optional): Caption for the image. Defaults to None.
+            embed (bool, optional): Embed a figure in the markdown file instead of saving it in the figure folder. Defaults to False.
 
         Returns:
             BaseSection: Image section object.
         """
         if isinstance(figure, Figure):
-            # Save the figure
-            image_path = self.save_path / FIGURE_FOLDER
-            if not image_path.exists():
-                image_path.mkdir()
-            image_path = image_path / f"{self.base_name}_image{self.section_type_count[SectionType.IMAGE]}.png"
-            figure.savefig(str(image_path), dpi=self.dpi)
-            figure = str(image_path)
-
-        section = self.add_section(None, ImageSection(self.mdFile, self.get_header_location(), figure, caption))
-        if section is not None:
-            self.image += 1
-            self.section_type_count[SectionType.IMAGE] += 1
-        return section
+            savefig_kwargs = {"dpi": self.dpi, "format": self.image_format}
+            if self.compress_level is not None and self.image_format == "png":
+                savefig_kwargs["pil_kwargs"] = {"compress_level": self.compress_level}
+
+            # A figure can only be drawn by one thread at a time
+            for pending_figure, future in self.pending_figures:
+                if pending_figure is figure:
+                    future.result()
+
+            if embed:
+                buf = io.BytesIO()
+                figure.savefig(buf, **savefig_kwargs)
+                figure = image_data_uri(buf.getvalue(), self.image_format)
+            else:
+                # Save the figure
+                if Section.figure_folder is None:
+                    figure_folder = self.save_path / FIGURE_FOLDER
+                    figure_folder.mkdir(parents=True, exist_ok=True)
+                    Section.figure_folder = str(figure_folder) + os.sep
+                image_path = f"{Section.figure_folder}{get_base_name(self.mdFile.file_name)}_image{self.section_type_count[SectionType.IMAGE]}.{self.image_format}"
+                if self.figure_executor is None:
+                    figure.savefig(image_path, **savefig_kwargs)
+                elif isinstance(self.figure_executor, ThreadPoolExecutor):
+                    self.pending_figures.append((figure, self.figure_executor.submit(figure.savefig, image_path, **savefig_kwargs)))
+                else:
+                    # Other executors, such as a process pool, pickle the call later on their own thread, so the figure
+                    # is copied now to save it as it was when added
+                    figure_data = pickle.dumps(figure)
+                    self.pending_figures.append((figure, self.figure_executor.submit(save_pickled_figure, figure_data, image_path, savefig_kwargs)))
+                figure = image_path
+        elif isinstance(figure, bytes):
+            figure = image_data_uri(figure)
+
+        return self.add_leaf(SectionType.IMAGE, ImageSection(self.mdFile, self.header_location, figure, caption))
     
     def add_table(self, table:List[str], columns:int=3, rows:int=3) -> BaseSection:
         """
@@ -376,16 +521,16 @@ class Section(BaseSection, UserDict):
         Returns:
             BaseSection: Table section object.
         """
-        if isinstance(table, DataFrame):
+        if is_dataframe(table):
             rows, columns = table.shape
-            col = table.columns.tolist()
+            col = [str(x) for x in table.columns]
             rows += 1
-            table = col + [str(x) for x in table.values.flatten().tolist()]
+            table = col + stringify_cells(table.to_numpy())
         elif isinstance(table, np.ndarray):
             rows, columns = table.shape
             col = [f"Column {x+1}" for x in range(table.shape[1])]
             rows += 1
-            table = col + [str(x) for x in table.flatten().tolist()]
+            table = col + stringify_cells(table)
         elif table is None:
             raise ValueError("Table cannot be None.")
             
@@ -396,11 +541,7 @@ class Section(BaseSection, UserDict):
         else:
             raise ValueError("Number of columns and rows must be specified.")
 
-        section = self.add_section(None, TableSection(self.mdFile, self.get_header_location(), table, columns, rows))
-        if section is not None:
-            self.table += 1
-            self.section_type_count[SectionType.TABLE] += 1
-        return section
+        return self.add_leaf(SectionType.TABLE, TableSection(self.mdFile, self.header_location, table, columns, rows))
     
     def add_list(self, items:list, marked_with:str="-") -> BaseSection:
         """
@@ -412,11 +553,7 @@ class Section(BaseSection, UserDict):
         Returns:
             BaseSection: List section object.
         """
-        count = self.add_section(None, ListSection(self.mdFile, self.get_header_location(), items, marked_with))
-        if count is not None:
-            self.list += 1
-            self.section_type_count[SectionType.LIST] += 1
-        return count
+        return self.add_leaf(SectionType.LIST, ListSection(self.mdFile, self.header_location, items, marked_with))
     
     def add_link(self, link:str, text:Optional[str]) -> BaseSection:
         """
@@ -429,11 +566,7 @@ class Section(BaseSection, UserDict):
         Returns:
             BaseSection: Link section object.
         """
-        section = self.add_section(None, LinkSection(self.mdFile, self.get_header_location(), link, text))
-        if section is not None:
-            self.link += 1
-            self.section_type_count[SectionType.LINK] += 1
-        return section
+        return self.add_leaf(SectionType.LINK, LinkSection(self.mdFile, self.header_location, link, text))
     
     def add_checkbox(self, text_list:List[str], checked:Union[List[bool],bool]=False) -> BaseSection:
         """
@@ -446,34 +579,61 @@ class Section(BaseSection, UserDict):
         Returns:
             BaseSection: Checkbox section object.
         """
-        section = self.add_section(None, CheckBoxSection(self.mdFile, self.get_header_location(), text_list, checked))
-        if section is not None:
-            self.checkbox += 1
-            self.section_type_count[SectionType.CHECKBOX] += 1
-        return section
+        return self.add_leaf(SectionType.CHECKBOX, CheckBoxSection(self.mdFile, self.header_location, text_list, checked))
     
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
+        self.render_header_to(buf, level=level, space_above=space_above, space_below=space_below)
+        self.render_subsections_to(buf, level=level + 1)
+
+    def render_subsections_to(self, buf:io.StringIO, level:int=1):
+        """
+        Write the markdown text of every section below this one to the buffer, depth first with a stack instead of
+        recursing down the tree. Subsections that override render or render_to are rendered through them, using render
+        when it is overridden by a subclass of the class that defines render_to.
+
+        Args:
+            buf (io.StringIO): Buffer to write the markdown text to.
+            level (int, optional): Header level of the direct subsections. Defaults to 1.
+        """
+        stack = [(section, level) for section in reversed(list(self.values()))]
+        pop, extend, container_render_to = stack.pop, stack.extend, Section.render_to  # Looked up once for the whole tree
+        while stack:
+            section, level = pop()
+            section_class = type(section)
+            if overrides_render(section_class):     # Writes through the MdUtils methods
+                BaseSection.render_to(section, buf, level=level)
+            elif section_class.render_to is not container_render_to:
+                section.render_to(buf, level=level)
+            else:
+                section.render_header_to(buf, level=level)
+                extend([(subsection, level + 1) for subsection in reversed(list(section.values()))])
+
+    def render_header_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
+        """
+        Write only the header of the section to the buffer, without its subsections.
+
+        Args:
+            buf (io.StringIO): Buffer to write the markdown text to.
+            level (int, optional): Header level of the section. Defaults to 1.
+            space_above (bool, optional): Add an empty line above the section. Defaults to False.
+            space_below (bool, optional): Add an empty line below the section. Defaults to True.
+        """
         if space_above:
-            self.mdFile.new_line()
-        self.mdFile.new_header(level=level, title=self.header)
+            buf.write(NEW_LINE)
+        buf.write(self.mdFile.header.choose_header(level=level, title=self.header))
         if space_below:
-            self.mdFile.new_line()
-
-        level += 1
-        for section_name, section in self.items():
-            section.render(level=level)
+            buf.write(NEW_LINE)
     
     def is_valid(self) -> bool:
-        for section_name, section in self:
-            if not section.is_valid():
-                return False
-        return True
+        return all(section.is_valid() for section in self.values())
     
 
 class TextSection(BaseSection):
     """
     Section to render text in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("text",)
+    section_type:SectionType = SectionType.TEXT
     def __init__(self, mdFile: MdUtils, location:str, text:str):
         """
         Text section to render text in the markdown file.
@@ -486,12 +646,12 @@ class TextSection(BaseSection):
         super().__init__(mdFile, location)
         self.text = text
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-            self.mdFile.new_line()
-        self.mdFile.new_paragraph(text=self.text)
+            buf.write(NEW_LINE)
+        buf.write("\n\n" + self.text)
         if space_below:
-            self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
         return True
@@ -506,6 +666,8 @@ class CodeSection(BaseSection):
     """
     Section to render code in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("code", "language")
+    section_type:SectionType = SectionType.CODE
     def __init__(self, mdFile: MdUtils, location:str, code:str, language:str="python"):
         """
         Code section to render code in the markdown file.
@@ -520,17 +682,15 @@ class CodeSection(BaseSection):
         self.code = code
         self.language = language
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-            self.mdFile.new_line()
-        self.mdFile.insert_code(code=self.code, language=self.language)
+            buf.write(NEW_LINE)
+        buf.write("\n\n" + TextUtils.insert_code(self.code, self.language))
         if space_below:
-            self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
-        if len(self.code) == 0:
-            return False
-        return True
+        return bool(self.code)
     
     def _to_json(self) -> Dict:
         return {
@@ -543,6 +703,8 @@ class ImageSection(BaseSection):
     """
     Section to render an image in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("image_path", "caption", "relative_path")
+    section_type:SectionType = SectionType.IMAGE
     def __init__(self, mdFile: MdUtils, location:str, image_path:Union[str,Path], caption:Optional[str]=None):
         """
         Image section to render an image in the markdown file.
@@ -550,21 +712,30 @@ class ImageSection(BaseSection):
         Args:
             mdFile (MdUtils): Markdown file object to render the image.
             location (str): Location of the image in the markdown file.
-            image_path (str): Path to the image file.
+            image_path (str): Path to the image file, or a data URI of an embedded image.
             caption (str, optional): Caption for the image. Defaults to None.
         """
         super().__init__(mdFile, location)
-        self.image_path:Path = image_path if isinstance(image_path, Path) else Path(image_path)
+        if isinstance(image_path, Path) or image_path.startswith("data:"):
+            self.image_path:Union[Path,str] = image_path   # Data URIs are kept as strings
+        else:
+            self.image_path = Path(image_path)
         self.caption = caption if caption is not None else ""
+        self.relative_path:Optional[Tuple[str, str, str]] = None   # Markdown file name, working directory and the image path relative to the file
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-            self.mdFile.new_line()
-        image_path = self.image_path.resolve().relative_to(Path(self.mdFile.file_name).resolve().parent)
-        self.mdFile.new_line(self.mdFile.new_inline_image(text=self.caption, path=str(image_path)))
-        #self.mdFile.new_line(text=rf"![{self.caption}]({str(self.image_path)})")
+            buf.write(NEW_LINE)
+        if isinstance(self.image_path, Path):
+            file_name, cwd = self.mdFile.file_name, os.getcwd()
+            if self.relative_path is None or self.relative_path[0] != file_name or self.relative_path[1] != cwd:
+                self.relative_path = (file_name, cwd, os.path.relpath(self.image_path, os.path.dirname(os.path.abspath(file_name))))
+            image_path = self.relative_path[2]
+        else:
+            image_path = self.image_path
+        buf.write(NEW_LINE + self.mdFile.new_inline_image(text=self.caption, path=image_path))
         if space_below:
-            self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
         return True
@@ -580,6 +751,8 @@ class TableSection(BaseSection):
     """
     Section to render a table in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("table", "columns", "rows")
+    section_type:SectionType = SectionType.TABLE
     def __init__(self, mdFile: MdUtils, location:str, table:List[str], columns:int=3, rows:int=3):
         """
         Table section to render a table in the markdown file.
@@ -596,12 +769,12 @@ class TableSection(BaseSection):
         self.columns = columns
         self.rows = rows
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-          self.mdFile.new_line()
-        self.mdFile.new_table(columns=self.columns, rows=self.rows, text=self.table)
+            buf.write(NEW_LINE)
+        buf.write(Table().create_table(columns=self.columns, rows=self.rows, text=self.table, text_align="center"))
         if space_below:
-          self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
         return True
@@ -617,6 +790,8 @@ class ListSection(BaseSection):
     """
     Section to render a list in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("items", "marked_with")
+    section_type:SectionType = SectionType.LIST
     def __init__(self, mdFile: MdUtils, location:str, items:list, marked_with:str="-"):
         """
         List section to render a list in the markdown file.
@@ -630,12 +805,12 @@ class ListSection(BaseSection):
         self.items = items
         self.marked_with = marked_with
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-            self.mdFile.new_line()
-        self.mdFile.new_list(items=self.items, marked_with=self.marked_with)
+            buf.write(NEW_LINE)
+        buf.write("\n" + MDList(self.items, self.marked_with).get_md())
         if space_below:
-            self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
         return True
@@ -649,6 +824,8 @@ class LinkSection(BaseSection):
     """
     Section to render a link in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("link", "text")
+    section_type:SectionType = SectionType.LINK
     def __init__(self, mdFile: MdUtils, location:str, link:str, text:Optional[str]):
         """
         Link section to render a link in the markdown file.
@@ -666,12 +843,12 @@ class LinkSection(BaseSection):
         else:
             self.text = text
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-            self.mdFile.new_line()
-        self.mdFile.new_line(text=rf"[{self.text}]({self.link})")
+            buf.write(NEW_LINE)
+        buf.write(NEW_LINE + rf"[{self.text}]({self.link})")
         if space_below:
-            self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
         return True
@@ -686,6 +863,8 @@ class CheckBoxSection(BaseSection):
     """
     Section to render a checkbox in the markdown file.
     """
+    __slots__ = BASE_SLOTS + ("text_list", "checked")
+    section_type:SectionType = SectionType.CHECKBOX
     def __init__(self, mdFile: MdUtils, location:str, text_list:List[str], checked:Union[List[bool],bool]=False):
         """
         Checkbox section to render a checkbox in the markdown file.
@@ -699,19 +878,18 @@ class CheckBoxSection(BaseSection):
         super().__init__(mdFile, location)
         self.text_list = text_list
         if isinstance(checked, bool):
-            self.checked = [checked for _ in range(len(text_list))]
+            self.checked = [checked] * len(text_list)
         elif isinstance(checked, list) and (len(checked) == len(text_list)):
             self.checked = checked
         else:
             raise ValueError("checked must be a boolean or a list of booleans with the same length as text.")
 
-    def render(self, level:int=1, space_above:bool=False, space_below:bool=True):
+    def render_to(self, buf:io.StringIO, level:int=1, space_above:bool=False, space_below:bool=True):
         if space_above:
-            self.mdFile.new_line()
-        for text, checked in zip(self.text_list, self.checked):
-            self.mdFile.new_line(text=rf"- [x]" + f" {text}" if checked else rf"- [ ]" + f" {text}")
+            buf.write(NEW_LINE)
+        buf.write("".join([f"{NEW_LINE}- [x] {text}" if checked else f"{NEW_LINE}- [ ] {text}" for text, checked in zip(self.text_list, self.checked)]))
         if space_below:
-            self.mdFile.new_line()
+            buf.write(NEW_LINE)
 
     def is_valid(self) -> bool:
         return True
@@ -720,4 +898,75 @@ class CheckBoxSection(BaseSection):
         return {
             "text_list": self.text_list,
             "checked": self.checked
-        }
\ No newline at end of file
+        }
+
+
+# Adds a leaf section from its json dictionary, keyed by the first key of the dictionary. The Section methods are
+# called unbound so that an MDGenerator, whose add_* methods take a header first, loads the same way as a Section.
+JSON_LOADERS:Dict[str,Callable[[Section,Dict],BaseSection]] = {
+    "text": lambda section, value: Section.add_text(section, value["text"]),
+    "code": lambda section, value: Section.add_code(section, value["code"], value["language"]),
+    "image_path": lambda section, value: Section.add_image(section, value["image_path"], value["caption"]),
+    "table": lambda section, value: Section.add_table(section, value["table"], value["columns"], value["rows"]),
+    "items": lambda section, value: Section.add_list(section, value["items"]),
+    "link": lambda section, value: Section.add_link(section, value["link"], value["text"]),
+    "text_list": lambda section, value: Section.add_checkbox(section, value["text_list"], value["checked"]),
+}
+
+def save_pickled_figure(figure_data:bytes, image_path:str, savefig_kwargs:Dict) -> None:
+    """
+    Save a pickled figure, run by executors that save figures in another process.
+
+    Args:
+        figure_data (bytes): Pickled figure.
+        image_path (str): Path to save the figure to.
+        savefig_kwargs (Dict): Keyword arguments of Figure.savefig.
+    """
+    pickle.loads(figure_data).savefig(image_path, **savefig_kwargs)
+
+def stringify_cells(cells:np.ndarray) -> List[str]:
+    """
+    Convert the cells of a table to strings in row-major order.
+
+    Args:
+        cells (np.ndarray): Array of table cells.
+
+    Returns:
+        List[str]: String of each cell.
+    """
+    # tolist() unboxes to python scalars in C, which str() formats faster than numpy's astype(str) does
+    return list(map(str, cells.ravel().tolist()))
+
+@lru_cache(maxsize=None)
+def overrides_render(section_class:type) -> bool:
+    """
+    Check if a section class defines render lower in its MRO than render_to, so a subclass of a built-in section that
+    only overrides render is rendered through it. Results are cached since every section of a class gives the same one.
+
+    Args:
+        section_class (type): Class of the section.
+
+    Returns:
+        bool: True if the section must be rendered through render.
+    """
+    for cls in section_class.__mro__:
+        if "render_to" in cls.__dict__:
+            return False
+        if "render" in cls.__dict__:
+            return True
+    return False
+
+def get_section_type(section:BaseSection) -> SectionType:
+    """
+    Get the section type of a leaf section. Subclasses of the leaf sections use the type of their parent class.
+
+    Args:
+        section (BaseSection): Section object to get the type of.
+
+    Returns:
+        SectionType: Type of the section.
+    """
+    section_type = section.section_type
+    if section_type is None:
+        raise ValueError("Invalid section type.")
+    return section_type
@@ -1,21 +1,175 @@
 
-from typing import List
+import base64
+import os
+import sys
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
 
-FILE_TYPES = [".md", ".markdown"]
+FILE_TYPES = (".md", ".markdown")
 FIGURE_FOLDER = "figures"
+WRITE_BUFFER_SIZE = 1 << 20    # Buffer size used when writing the markdown and json files
+COMPACT_JSON = {"separators": (",", ":"), "ensure_ascii": False}    # json.dump arguments for compact json files
+SHARED_STRING_KEYS = ("text", "code", "caption")     # Section values that can be stored once in the shared strings
+IMAGE_SIGNATURES = {b"\x89PNG": "image/png", b"\xff\xd8\xff": "image/jpeg", b"GIF8": "image/gif", b"<svg": "image/svg+xml"}
+IMAGE_MIME_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "gif": "image/gif", "svg": "image/svg+xml"}
 
-def is_file_type(file_name: str, file_types: List[str] = FILE_TYPES) -> bool:
+def is_file_type(file_name: str, file_types: Union[Tuple[str, ...], List[str]] = FILE_TYPES) -> bool:
     """
     Check if the file is of the given type
 
     Args:
         file_name (str): Name of the file
-        file_types (list[str]): List of file types
+        file_types (Union[Tuple[str, ...], List[str]]): File types to check for
 
     Returns:
         bool: True if the file is of the given type
     """
-    for file_type in file_types:
-        if file_name.endswith(file_type):
-            return True
-    return False
\ No newline at end of file
+    return file_name.endswith(file_types if isinstance(file_types, tuple) else tuple(file_types))
+
+
+@lru_cache(maxsize=64)
+def get_base_name(file_name: str) -> str:
+    """
+    Get the name of a file without its folder or extension. Results are cached since every figure added to a
+    markdown file names itself after the file.
+
+    Args:
+        file_name (str): Path of the file, e.g. "example/GeneratedMD.md"
+
+    Returns:
+        str: Name of the file, e.g. "GeneratedMD"
+    """
+    return os.path.basename(file_name).split(".")[0]
+
+
+@lru_cache(maxsize=4096)
+def split_heading(heading: str) -> Tuple[str, ...]:
+    """
+    Split a section heading into the headers of each level. A single leading "/" is ignored.
+    Results are cached since the same headings are indexed repeatedly while building a report.
+
+    Args:
+        heading (str): Heading of the section, e.g. "Section 1/Subsection 1"
+
+    Returns:
+        Tuple[str, ...]: Header of each level
+    """
+    if heading.startswith("/"):
+        heading = heading[1:]
+    return tuple(sys.intern(header) for header in heading.split("/"))   # Repeated headers share one string
+
+
+def split_file_name(file_name: str, extension: str) -> Tuple[Optional[str], str]:
+    """
+    Split a file name into its directory and its name without the extension.
+
+    Args:
+        file_name (str): Name of the file, optionally with a directory
+        extension (str): Extension to remove from the name, e.g. "md"
+
+    Returns:
+        Tuple[Optional[str], str]: Directory of the file (None if not given) and the name of the file
+    """
+    directory, name = os.path.split(file_name)
+    root, ext = os.path.splitext(name)
+    if ext == "." + extension:
+        name = root
+    return directory or None, name
+
+
+def share_repeated_strings(json_dict: Dict, keys: Tuple[str, ...] = SHARED_STRING_KEYS) -> Tuple[Dict, List[str]]:
+    """
+    Replace the strings that are used more than once in a json dictionary with references to a list of strings.
+
+    Args:
+        json_dict (Dict): Json dictionary of the markdown file. It is not changed.
+        keys (Tuple[str, ...]): Keys of the values that can be shared.
+
+    Returns:
+        Tuple[Dict, List[str]]: Json dictionary with {"$ref": index} in place of the repeated strings, and the list
+            of repeated strings.
+    """
+    counts = Counter()
+    def count(node: Dict) -> None:
+        for key, value in node.items():
+            if isinstance(value, dict):
+                count(value)
+            elif key in keys and isinstance(value, str):
+                counts[value] += 1
+    count(json_dict)
+
+    strings = [string for string, n in counts.items() if n > 1]
+    index = {string: i for i, string in enumerate(strings)}
+    def replace(node: Dict) -> Dict:
+        new_node = {}
+        for key, value in node.items():
+            if isinstance(value, dict):
+                value = replace(value)
+            elif key in keys and isinstance(value, str) and value in index:
+                value = {"$ref": index[value]}
+            new_node[key] = value
+        return new_node
+    return replace(json_dict), strings
+
+
+def resolve_strings(json_dict: Dict, strings: List[str]) -> Dict:
+    """
+    Replace the {"$ref": index} references made by share_repeated_strings with the strings they point to, in place.
+
+    Args:
+        json_dict (Dict): Json dictionary with references.
+        strings (List[str]): Shared strings of the json file.
+
+    Returns:
+        Dict: The json dictionary without references.
+    """
+    strings = [sys.intern(string) for string in strings]   # Every reference shares the one string object
+    for key, value in json_dict.items():
+        if isinstance(value, dict):
+            if "$ref" in value and len(value) == 1:
+                json_dict[key] = strings[value["$ref"]]
+            else:
+                resolve_strings(value, strings)
+    return json_dict
+
+
+def is_dataframe(obj) -> bool:
+    """
+    Check if the object is a pandas DataFrame without importing pandas. If pandas has not been imported, nothing
+    can be a DataFrame yet.
+
+    Args:
+        obj: Object to check
+
+    Returns:
+        bool: True if the object is a DataFrame
+    """
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(obj, pandas.DataFrame)
+
+
+def image_data_uri(data: bytes, image_format: Optional[str] = None) -> str:
+    """
+    Encode the bytes of an image as a data URI, which can be used in place of an image path to embed the image.
+
+    Args:
+        data (bytes): Contents of an image file
+        image_format (Optional[str], optional): Format of the image, e.g. "png". Defaults to None.
+            - If None, the format is found from the start of the image.
+
+    Returns:
+        str: Data URI of the image
+    """
+    if image_format is not None:
+        mime_type = IMAGE_MIME_TYPES.get(image_format.lower(), f"image/{image_format.lower()}")
+    else:
+        for signature, mime_type in IMAGE_SIGNATURES.items():
+            if data.startswith(signature):
+                break
+        else:
+            if data.startswith(b"<?xml") and b"<svg" in data:  # An xml declaration can start any xml file, not only svg
+                mime_type = "image/svg+xml"
+            else:
+                raise ValueError("Unknown image type, the image must be a png, jpeg, gif or svg file.")
+    return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
@@ -1,18 +1,46 @@
-from time import sleep
+from functools import lru_cache
 import unittest
 
+import matplotlib
+matplotlib.use("Agg")     # Headless backend, so no GUI toolkit is started for the figures
+import numpy as np
 from pandas import DataFrame
 from PyMD import MDGenerator
+from temp_dir_case import TempDirTestCase
 
+FILE_NAME = "GeneratedMD_AddingRandomStuff"
 
-class AddingRandomStuff(unittest.TestCase):
-    setup_done = False
 
-    def setup(self):
-        if self.setup_done:
-            return
-        
-        mdGen = MDGenerator("/home/rlfowler/Documents/myprojects/PyMD/example", file_name='GeneratedMD', title="Generated Markdown", author="Author")
+@lru_cache(maxsize=1)
+def random_figure():
+    """
+    Plot random data once, so rerunning the tests in the same process reuses the figure.
+    """
+    import matplotlib.pyplot as plt
+
+    # Generate random data
+    x = np.linspace(0, 10, 100)
+    y = np.random.randn(100)
+
+    # Create a figure and plot the data
+    fig, ax = plt.subplots()
+    ax.plot(x, y)
+
+    # Add labels and title
+    ax.set_xlabel('X-axis')
+    ax.set_ylabel('Y-axis')
+    ax.set_title('Random Figure')
+    return fig
+
+
+class AddingRandomStuff(TempDirTestCase):
+    mdGen = None
+    data = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        mdGen = MDGenerator(cls.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author")
         mdGen.add_text("Section 1", "This is the first section.")
         mdGen.add_text("Section 2", "This is the second section.")
         mdGen.add_code("Section 2", "print('Hello, World!')")
@@ -20,24 +48,8 @@ class AddingRandomStuff(unittest.TestCase):
         mdGen.add_text("Section 1/Subsection 2", "This is a subsection of the first section.")
         mdGen.add_text("Section 1/Subsection 2/Subsubsection 1", "This is a subsubsection of the second subsection.")
 
-        import matplotlib.pyplot as plt
-        import numpy as np
-
-        # Generate random data
-        x = np.linspace(0, 10, 100)
-        y = np.random.randn(100)
-
-        # Create a figure and plot the data
-        fig, ax = plt.subplots()
-        ax.plot(x, y)
-
-        # Add labels and title
-        ax.set_xlabel('X-axis')
-        ax.set_ylabel('Y-axis')
-        ax.set_title('Random Figure')
-
         # Add the image to the markdown file
-        mdGen.add_image("Section 1", fig, "This is a random figure.")
+        mdGen.add_image("Section 1", random_figure(), "This is a random figure.")
 
         # Add a list to the markdown file
         mdGen.add_list("Section 2", ["Item 1", "Item 2", "Item 3"])
@@ -62,49 +74,37 @@ class AddingRandomStuff(unittest.TestCase):
         # mdGen.add_table("Section 3/Pandas DataFrame Table", df)
         mdGen["Section 3"]["Pandas DataFrame Table"].add_table(df)
 
-        # Save the markdown file
-        mdGen.save()
-        self.setup_done = True
+        # Render the markdown once for every test, without writing it
+        cls.mdGen = mdGen
+        cls.data = mdGen.get_md_text()
+
+    def test_save(self):
+        # Saving again writes the same file instead of appending the sections a second time
+        self.mdGen.save()
+        self.mdGen.save()
+        self.assertEqual(self.data, (self.tmp / (FILE_NAME + ".md")).read_text())
 
     def test_add_text(self):
-        self.setup()
-        with open("/home/rlfowler/Documents/myprojects/PyMD/example/GeneratedMD.md", "r") as file:
-            data = file.read()
-            self.assertIn("This is the first section.", data)
-            self.assertIn("This is the second section.", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsubsection of the second subsection.", data)
+        self.assertIn("This is the first section.", self.data)
+        self.assertIn("This is the second section.", self.data)
+        self.assertIn("This is a subsection of the first section.", self.data)
+        self.assertIn("This is a subsection of the first section.", self.data)
+        self.assertIn("This is a subsubsection of the second subsection.", self.data)
 
     def test_add_code(self):
-        self.setup()
-        with open("/home/rlfowler/Documents/myprojects/PyMD/example/GeneratedMD.md", "r") as file:
-            data = file.read()
-            self.assertIn("```python\nprint('Hello, World!')\n```", data)
+        self.assertIn("```python\nprint('Hello, World!')\n```", self.data)
 
     def test_add_image(self):
-        self.setup()
-        with open("/home/rlfowler/Documents/myprojects/PyMD/example/GeneratedMD.md", "r") as file:
-            data = file.read()
-            self.assertIn("This is a random figure.", data)
+        self.assertIn("This is a random figure.", self.data)
 
     def test_add_list(self):
-        self.setup()
-        with open("/home/rlfowler/Documents/myprojects/PyMD/example/GeneratedMD.md", "r") as file:
-            data = file.read()
-            self.assertIn("- Item 1\n- Item 2\n- Item 3", data)
+        self.assertIn("- Item 1\n- Item 2\n- Item 3", self.data)
 
     def test_add_link(self):
-        self.setup()
-        with open("/home/rlfowler/Documents/myprojects/PyMD/example/GeneratedMD.md", "r") as file:
-            data = file.read()
-            self.assertIn("[Google](https://www.google.com)", data)
+        self.assertIn("[Google](https://www.google.com)", self.data)
 
     def test_add_checkbox(self):
-        self.setup()
-        with open("/home/rlfowler/Documents/myprojects/PyMD/example/GeneratedMD.md", "r") as file:
-            data = file.read()
-            self.assertIn("- [x] Check 1  \n- [ ] Check 2  \n- [x] Check 3  ", data)
+        self.assertIn("- [x] Check 1  \n- [ ] Check 2  \n- [x] Check 3  ", self.data)
 
     # def test_add_table(self):
     #     self.setup()
@@ -1,85 +1,261 @@
-from time import sleep
+from concurrent.futures import ProcessPoolExecutor
+import os
 import unittest
+from typing import get_type_hints
+from unittest.mock import patch
 
+import matplotlib
+matplotlib.use("Agg")     # Headless backend, so no GUI toolkit is started for the figures
 from pandas import DataFrame
 from PyMD import MDGenerator
+from temp_dir_case import TempDirTestCase
+from PyMD.tools import sections
+from PyMD.tools.sections import BaseSection, Section, TextSection
 from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
+from pathlib import Path
 
+FILE_NAME = "GeneratedMD_AssignmentTypes"
 
-class AssignmentTypes(unittest.TestCase):
+# Only the headers of this table are checked, so its values stay fixed
+HEADERS = ["Header 1", "Header 2", "Header 3", "Header 4"]
+TABLE_DF = DataFrame(np.zeros((6, 4), dtype=np.int64), columns=HEADERS)
+
+
+class AssignmentTypes(TempDirTestCase):
     mdGen = None
 
-    def setup(self):
-        self.mdGen = MDGenerator("example", title="Generated Markdown", author="Author")
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.md_path = cls.tmp / (FILE_NAME + ".md")
+
+    def setUp(self):
+        self.mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author")
         
 
     def test_string_assignment(self):
-        self.setup()
         self.mdGen["Section 1"] = "This is the first section."
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("This is the first section.", data)
+        data = self.md_path.read_text()
+        self.assertIn("This is the first section.", data)
 
     def test_figure_assignment(self):
-        self.setup()
-
         # Create a random figure
         fig, ax = plt.subplots()
         x = np.linspace(0, 2 * np.pi, 100)
         y = np.sin(x)
         ax.plot(x, y)
+
+        # Only the image reference is checked here, so skip the PNG encoding
+        with patch.object(Figure, "savefig", autospec=True) as savefig:
+            self.mdGen["Section 1"] = fig
+        savefig.assert_called_once()
+        self.mdGen.save()
+
+        data = self.md_path.read_text()
+        self.assertIn(f"figures/{FILE_NAME}_image0.png", data)
+
+        # Figures are named after the file of the generator they are added to, not the last one created
+        other = MDGenerator(self.tmp, file_name=FILE_NAME + "_other")
+        with patch.object(Figure, "savefig", autospec=True) as savefig:
+            self.mdGen["Section 2"] = fig
+        self.assertRegex(Path(savefig.call_args[0][1]).name, rf"^{FILE_NAME}_image\d+\.png$")
+        self.assertEqual(self.mdGen["Section 2"]["image0"].image_path, Path(savefig.call_args[0][1]))
+
+    def test_background_figure_assignment(self):
+        self.mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author", figure_workers=2)
+
+        # Add the same figure twice so its saves must not overlap
+        fig, ax = plt.subplots()
+        x = np.linspace(0, 2 * np.pi, 100)
+        ax.plot(x, np.sin(x))
         self.mdGen["Section 1"] = fig
+        self.mdGen["Section 2"] = fig
         self.mdGen.save()
+        self.mdGen.close()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("figures/GeneratedMD_image0.png", data)
+        self.assertEqual(self.mdGen.pending_figures, [])
+        self.assertTrue((self.tmp / "figures" / f"{FILE_NAME}_image1.png").exists())
+        data = self.md_path.read_text()
+        self.assertIn(f"figures/{FILE_NAME}_image0.png", data)
+        self.assertIn(f"figures/{FILE_NAME}_image1.png", data)
 
-    def test_dataframe_assignment(self):
-        self.setup()
+    def test_process_pool_figure_assignment(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author", figure_executor=executor)
+            fig, ax = plt.subplots()
+            x = np.linspace(0, 2 * np.pi, 100)
+            ax.plot(x, np.sin(x))
+            self.mdGen["Section 1"] = fig
 
-        # Create a random table
-        headers = ["Header 1", "Header 2", "Header 3", "Header 4"]
-        table = np.random.randint(0, 10, (6, 4))
-        df = DataFrame(table, columns=headers)
-        self.mdGen["Section 1"] = df
+            # Changes made after adding the figure are not in the saved image
+            fig.set_facecolor("red")
+            self.mdGen.save()
+            self.mdGen.close()
+
+        self.assertEqual(self.mdGen.pending_figures, [])
+        image = plt.imread(self.tmp / "figures" / f"{FILE_NAME}_image0.png")
+        self.assertListEqual(image[0, 0].tolist(), [1.0, 1.0, 1.0, 1.0])
+
+    def test_compressed_figure_assignment(self):
+        fig, ax = plt.subplots()
+        x = np.linspace(0, 2 * np.pi, 100)
+        ax.plot(x, np.sin(x))
+
+        # Level 0 stores the image without compressing it
+        sizes = []
+        for compress_level in [None, 0]:
+            self.mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author", compress_level=compress_level)
+            self.mdGen["Section 1"] = fig
+            sizes.append((self.tmp / "figures" / f"{FILE_NAME}_image0.png").stat().st_size)
+        self.assertLess(sizes[0], sizes[1])
+
+    def test_svg_figure_assignment(self):
+        fig, ax = plt.subplots()
+        x = np.linspace(0, 2 * np.pi, 100)
+        ax.plot(x, np.sin(x))
+        self.mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author", image_format="svg", compress_level=1)
+        self.mdGen["Section 1"] = fig
+        self.mdGen.add_image("Section 1", fig, "Embedded figure", embed=True)
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("Header 1", data)
-            self.assertIn("Header 2", data)
-            self.assertIn("Header 3", data)
-            self.assertIn("Header 4", data)
+        self.assertTrue((self.tmp / "figures" / f"{FILE_NAME}_image0.svg").exists())
+        data = self.md_path.read_text()
+        self.assertIn(f"(figures/{FILE_NAME}_image0.svg)", data)
+        self.assertIn("![Embedded figure](data:image/svg+xml;base64,", data)
 
-    def test_numpy_array_assignment(self):
-        self.setup()
+    def test_embedded_figure_assignment(self):
+        fig, ax = plt.subplots()
+        x = np.linspace(0, 2 * np.pi, 100)
+        ax.plot(x, np.sin(x))
+        self.mdGen.add_image("Section 1", fig, "Embedded figure", embed=True)
+        self.mdGen.add_image("Section 1", b"GIF89a", "Embedded bytes")
+        self.mdGen.save()
 
+        data = self.md_path.read_text()
+        self.assertIn("![Embedded figure](data:image/png;base64,iVBORw0KGgo", data)
+        self.assertIn("![Embedded bytes](data:image/gif;base64,R0lGODlh)", data)
+
+        # Only xml files holding an svg image are embedded as svg, and unknown images are not given a type
+        self.mdGen.add_image("Section 2", b'<?xml version="1.0"?><svg/>', "Embedded svg")
+        self.assertIn("![Embedded svg](data:image/svg+xml;base64,", self.mdGen.get_md_text())
+        for data in [b'<?xml version="1.0"?><note/>', b"Not an image"]:
+            with self.assertRaises(ValueError):
+                self.mdGen.add_image("Section 2", data, "Unknown bytes")
+
+    def test_moved_image_link(self):
+        self.mdGen.add_image("Section 1", str(self.tmp / "figures" / "plot.png"), "Plot")
+        self.assertIn(f"![Plot]({os.path.join('figures', 'plot.png')})", self.mdGen.get_md_text())
+
+        # The link is relative to wherever the markdown file is saved now
+        self.mdGen.mdFile.file_name = str(self.tmp / "reports" / (FILE_NAME + ".md"))
+        data = self.mdGen.get_md_text()
+        self.assertIn(f"![Plot]({os.path.join('..', 'figures', 'plot.png')})", data)
+
+    def test_dataframe_assignment(self):
+        self.mdGen["Section 1"] = TABLE_DF
+        self.mdGen.save()
+
+        data = self.md_path.read_text()
+        self.assertIn("Header 1", data)
+        self.assertIn("Header 2", data)
+        self.assertIn("Header 3", data)
+        self.assertIn("Header 4", data)
+
+    def test_numpy_array_assignment(self):
         # Create a random table
         table = np.random.randint(0, 10, (6, 4))
         self.mdGen["Section 1"] = table
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("Column 1", data)
-            self.assertIn("Column 2", data)
-            self.assertIn("Column 3", data)
-            self.assertIn("Column 4", data)
+        data = self.md_path.read_text()
+        self.assertIn("Column 1", data)
+        self.assertIn("Column 2", data)
+        self.assertIn("Column 3", data)
+        self.assertIn("Column 4", data)
 
     def test_list_assignment(self):
-        self.setup()
-
         # Create a random list
         lst = ["Item 1", "Item 2", "Item 3"]
         self.mdGen["Section 1"] = lst
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("Item 1", data)
-            self.assertIn("Item 2", data)
-            self.assertIn("Item 3", data)
\ No newline at end of file
+        data = self.md_path.read_text()
+        self.assertIn("Item 1", data)
+        self.assertIn("Item 2", data)
+        self.assertIn("Item 3", data)
+
+    def test_custom_section_assignment(self):
+        # Section that only renders through the MdUtils methods
+        class QuoteSection(BaseSection):
+            def render(self, level=1, space_above=False, space_below=True):
+                self.mdFile.new_paragraph("> This is a quote.")
+
+            def is_valid(self):
+                return True
+
+        self.mdGen["Section 1"]["quote"] = QuoteSection(self.mdGen.mdFile, "Section 1")
+        self.mdGen["Section 1"] = "This is after the quote."
+        self.mdGen.save()
+
+        data = self.md_path.read_text()
+        self.assertIn("> This is a quote.\n\nThis is after the quote.", data)
+
+        # Subclasses of the built-in sections are named and counted by the type they inherit
+        class NoteSection(TextSection):
+            pass
+
+        self.mdGen["Section 1"].add_section(None, NoteSection(self.mdGen.mdFile, "Section 1", "This is a note."))
+        self.assertIsInstance(self.mdGen["Section 1"]["text1"], NoteSection)
+        with self.assertRaises(ValueError):
+            self.mdGen["Section 1"].add_section(None, QuoteSection(self.mdGen.mdFile, "Section 1"))
+
+        # Subclasses of the built-in sections that only override render are rendered through it
+        class ShoutSection(TextSection):
+            def render(self, level=1, space_above=False, space_below=True):
+                self.mdFile.new_paragraph(self.text.upper())
+
+        self.mdGen["Section 1"].add_section(None, ShoutSection(self.mdGen.mdFile, "Section 1", "This is a shout."))
+        self.assertIn("THIS IS A SHOUT.", self.mdGen.get_md_text())
+
+        # Container sections can override render too
+        class BoxedSection(Section):
+            def render(self, level=1, space_above=False, space_below=True):
+                self.mdFile.new_paragraph(f"[{self.header}]")
+
+        self.mdGen["Section 2"]["Boxed"] = BoxedSection(self.mdGen.mdFile, "Boxed", "Section 2")
+        self.mdGen["Section 2"] = "This is after the box."
+        self.assertIn("[Boxed]\n\nThis is after the box.", self.mdGen.get_md_text())
+
+    def test_nested_section_assignment(self):
+        self.mdGen["Section 1/Subsection 1/Subsubsection 1"] = "This is a subsubsection."
+        section = self.mdGen["Section 1"]["Subsection 1"]["Subsubsection 1"]
+        self.assertIs(self.mdGen["Section 1/Subsection 1/Subsubsection 1"], section)
+        self.assertTrue(self.mdGen.is_valid())
+
+        # A deleted section is replaced by a new one when its path is used again
+        del self.mdGen["Section 1"]["Subsection 1"]
+        self.mdGen["Section 1/Subsection 1/Subsubsection 1"] = "This replaces the subsubsection."
+        self.assertIsNot(self.mdGen["Section 1/Subsection 1/Subsubsection 1"], section)
+        self.mdGen.save()
+
+        data = self.md_path.read_text()
+        self.assertNotIn("This is a subsubsection.", data)
+        self.assertIn("This replaces the subsubsection.", data)
+
+        del self.mdGen["Section 1/Subsection 1/Subsubsection 1"]
+        self.assertNotIn("Section 1/Subsection 1/Subsubsection 1", self.mdGen.section_headers)
+        self.assertNotIn("Subsubsection 1", self.mdGen["Section 1/Subsection 1"])
+        with self.assertRaises(KeyError):
+            del self.mdGen["Section 3/Subsection 1"]
+
+    def test_type_hints(self):
+        # The annotations resolve at runtime, even the ones naming pandas types
+        for cls in [MDGenerator, Section, BaseSection] + [value for value in vars(sections).values() if isinstance(value, type) and issubclass(value, BaseSection)]:
+            for name, method in vars(cls).items():
+                if callable(method):
+                    with self.subTest(cls=cls.__name__, method=name):
+                        get_type_hints(method)
@@ -1,19 +1,24 @@
-from time import sleep
 import unittest
 
 from PyMD import MDGenerator
-from pandas import DataFrame
+from temp_dir_case import TempDirTestCase
 
+FILE_NAME = "GeneratedMD_IndexingMethods"
 
-class IndexingMethods(unittest.TestCase):
+
+class IndexingMethods(TempDirTestCase):
     mdGen = None
 
-    def setup(self):
-        self.mdGen = MDGenerator("example", title="Generated Markdown", author="Author")
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.md_path = cls.tmp / (FILE_NAME + ".md")
+
+    def setUp(self):
+        self.mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author")
         
 
     def test_single_bracketing(self):
-        self.setup()
         self.mdGen["Section 1"].add_text("This is the first section.")
         self.mdGen["Section 2"].add_text("This is the second section.")
         self.mdGen["Section 2"].add_code("print('Hello, World!')")
@@ -26,30 +31,28 @@ class IndexingMethods(unittest.TestCase):
 
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("Section 1", data)
-            self.assertIn("Section 2", data)
-            self.assertIn("Section 3", data)
-            self.assertIn("Subsection 1", data)
-            self.assertIn("Subsection 2", data)
-            self.assertIn("Subsection 1a", data)
-            self.assertIn("Subsubsection 1", data)
-            self.assertIn("Subsubsection 1a", data)
-            self.assertIn("Subsubsubsection 1a", data)
-
-            self.assertIn("This is the first section.", data)
-            self.assertIn("This is the second section.", data)
-            self.assertIn("print('Hello, World!')", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsection of the first section.a", data)
-            self.assertIn("This is a subsubsection of the second subsection.", data)
-            self.assertIn("This is a subsubsection of the second subsection.a", data)
-            self.assertIn("This is a subsubsection of the second subsection.b", data)
-            self.assertIn("This is a subsubsubsection of the second subsection.abc", data)
+        data = self.md_path.read_text()
+        self.assertIn("Section 1", data)
+        self.assertIn("Section 2", data)
+        self.assertIn("Section 3", data)
+        self.assertIn("Subsection 1", data)
+        self.assertIn("Subsection 2", data)
+        self.assertIn("Subsection 1a", data)
+        self.assertIn("Subsubsection 1", data)
+        self.assertIn("Subsubsection 1a", data)
+        self.assertIn("Subsubsubsection 1a", data)
+
+        self.assertIn("This is the first section.", data)
+        self.assertIn("This is the second section.", data)
+        self.assertIn("print('Hello, World!')", data)
+        self.assertIn("This is a subsection of the first section.", data)
+        self.assertIn("This is a subsection of the first section.a", data)
+        self.assertIn("This is a subsubsection of the second subsection.", data)
+        self.assertIn("This is a subsubsection of the second subsection.a", data)
+        self.assertIn("This is a subsubsection of the second subsection.b", data)
+        self.assertIn("This is a subsubsubsection of the second subsection.abc", data)
 
     def test_multi_bracketing(self):
-        self.setup()
         self.mdGen["Section 1/Subsection 1/Subsubsection 1"].add_text("This is a subsubsection of the first section.")
         self.mdGen["Section 1/Subsection 1/Subsubsection 1"].add_text("This is a subsubsection of the first section.a")
         self.mdGen["Section 2/Subsection 1a/Subsubsection 1a"].add_text("This is a subsubsection of the first section.b")
@@ -57,23 +60,21 @@ class IndexingMethods(unittest.TestCase):
 
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("Section 1", data)
-            self.assertIn("Section 2", data)
-            self.assertIn("Subsection 1", data)
-            self.assertIn("Subsection 1a", data)
-            self.assertIn("Subsubsection 1", data)
-            self.assertIn("Subsubsection 1a", data)
-            self.assertIn("meh", data)
-
-            self.assertIn("This is a subsubsection of the first section.", data)
-            self.assertIn("This is a subsubsection of the first section.a", data)
-            self.assertIn("This is a subsubsection of the first section.b", data)
-            self.assertIn("This is a subsubsection of the first section.c", data)
+        data = self.md_path.read_text()
+        self.assertIn("Section 1", data)
+        self.assertIn("Section 2", data)
+        self.assertIn("Subsection 1", data)
+        self.assertIn("Subsection 1a", data)
+        self.assertIn("Subsubsection 1", data)
+        self.assertIn("Subsubsection 1a", data)
+        self.assertIn("meh", data)
+
+        self.assertIn("This is a subsubsection of the first section.", data)
+        self.assertIn("This is a subsubsection of the first section.a", data)
+        self.assertIn("This is a subsubsection of the first section.b", data)
+        self.assertIn("This is a subsubsection of the first section.c", data)
 
     def test_empty_subsections(self):
-        self.setup()
         self.mdGen["Section 1//Subsubsection 1"].add_text("This is a subsubsection of the first section.")
         self.mdGen["Section 1//Subsubsection 1"].add_text("This is a subsubsection of the first section.a")
         self.mdGen["Section 2/Subsection 1a/"].add_text("This is a subsubsection of the first section.b")
@@ -83,22 +84,80 @@ class IndexingMethods(unittest.TestCase):
 
         self.mdGen.save()
 
-        with open("example/GeneratedMD.md", "r") as f:
-            data = f.read()
-            self.assertIn("Section 1", data)
-            self.assertIn("Section 2", data)
-            self.assertIn("Section 3", data)
-            self.assertIn("Subsection 1a", data)
-            self.assertIn("Subsubsection 1", data)
-            self.assertIn("Subsubsection 1a", data)
-            self.assertIn("meh", data)
-
-            self.assertIn("This is a subsubsection of the first section.", data)
-            self.assertIn("This is a subsubsection of the first section.a", data)
-            self.assertIn("This is a subsubsection of the first section.b", data)
-            self.assertIn("This is a subsubsection of the first section.c", data)
-            self.assertIn("This is a subsubsection of the first section.d", data)
-            self.assertIn("This is a subsubsection of the first section.e", data)
+        data = self.md_path.read_text()
+        self.assertIn("Section 1", data)
+        self.assertIn("Section 2", data)
+        self.assertIn("Section 3", data)
+        self.assertIn("Subsection 1a", data)
+        self.assertIn("Subsubsection 1", data)
+        self.assertIn("Subsubsection 1a", data)
+        self.assertIn("meh", data)
+
+        self.assertIn("This is a subsubsection of the first section.", data)
+        self.assertIn("This is a subsubsection of the first section.a", data)
+        self.assertIn("This is a subsubsection of the first section.b", data)
+        self.assertIn("This is a subsubsection of the first section.c", data)
+        self.assertIn("This is a subsubsection of the first section.d", data)
+        self.assertIn("This is a subsubsection of the first section.e", data)
+
+    def test_dict_methods(self):
+        # update and setdefault convert their values like assignment does
+        self.mdGen.update({"Section 1": "This is the first section."}, **{"Section 2": ["Item 1", "Item 2"]})
+        self.assertIs(self.mdGen.setdefault("Section 1", "Not added."), self.mdGen["Section 1"])
+        self.mdGen.setdefault("Section 3", "This is the third section.")
+        data = self.mdGen.get_md_text()
+        self.assertIn("This is the first section.", data)
+        self.assertIn("- Item 1\n- Item 2", data)
+        self.assertIn("This is the third section.", data)
+        self.assertNotIn("Not added.", data)
+
+        # pop, popitem and clear forget the removed sections and leave them out of the json
+        self.mdGen["Section 1/Subsection 1"] = "This is a subsection."
+        section = self.mdGen.pop("Section 1")
+        self.assertEqual(section.header, "Section 1")
+        self.assertIsNone(self.mdGen.pop("Section 1", None))
+        with self.assertRaises(KeyError):
+            self.mdGen.pop("Section 1")
+        self.assertNotIn("Section 1", self.mdGen.section_headers)
+        self.assertNotIn("Section 1/Subsection 1", self.mdGen.section_headers)
+        self.assertNotIn(("Section 1", "Subsection 1"), self.mdGen.section_paths)
+        self.assertNotIn("Section 1", self.mdGen._to_json())
+
+        self.assertEqual(self.mdGen.popitem()[0], "Section 3")
+        self.assertNotIn("Section 3", self.mdGen.section_headers)
+        self.assertNotIn("Section 3", self.mdGen._to_json())
+
+        self.mdGen.clear()
+        self.assertDictEqual(self.mdGen.section_headers, {})
+        self.assertListEqual(list(self.mdGen._to_json()), ["MDG_Settings"])
+        self.assertNotIn("This is the first section.", self.mdGen.get_md_text())
+
+    def test_moved_section(self):
+        self.mdGen["Section 1/Subsection 1/Subsubsection 1"] = "This is a subsubsection."
+        subsection = self.mdGen["Section 1/Subsection 1"]
+        subsubsection = self.mdGen["Section 1/Subsection 1/Subsubsection 1"]
+        del self.mdGen["Section 1"]["Subsection 1"]
+
+        # Every section below a moved section is found at its new path
+        self.mdGen["Section 2"]["Subsection 2"] = subsection
+        self.assertTupleEqual(subsubsection.path, ("Section 2", "Subsection 2", "Subsubsection 1"))
+        self.assertIs(self.mdGen.section_paths[("Section 2", "Subsection 2", "Subsubsection 1")], subsubsection)
+        self.assertNotIn(("Section 1", "Subsection 1", "Subsubsection 1"), self.mdGen.section_paths)
+        self.assertIs(self.mdGen["Section 2/Subsection 2/Subsubsection 1"], subsubsection)
+        self.assertIsNot(self.mdGen["Section 1/Subsection 1/Subsubsection 1"], subsubsection)
+
+        # The moved sections and the sections added below them are saved at their new location
+        self.assertEqual(subsubsection.header_location, "Section 2/Subsection 2/Subsubsection 1")
+        self.assertListEqual([key for key, value in self.mdGen.section_headers.items() if value is subsubsection], ["Section 2/Subsection 2/Subsubsection 1"])
+        self.assertEqual(subsection.add_text("This is added after the move.").location, "Section 2/Subsection 2")
+        self.mdGen.save_json()
+
+        loaded = MDGenerator(self.tmp, file_name=FILE_NAME)
+        loaded.load_json()
+        data = loaded.get_md_text()
+        self.assertIn("This is a subsubsection.", data)
+        self.assertIn("This is added after the move.", data)
+        self.assertIn("Subsubsection 1", data)
 
     # def test_empty_base(self)
 
@@ -1,17 +1,58 @@
+import json
 import unittest
 
+import matplotlib
+matplotlib.use("Agg")     # Headless backend, so no GUI toolkit is started for the figures
+import numpy as np
 from pandas import DataFrame
 from PyMD import MDGenerator
-
-
-class SavingFiles(unittest.TestCase):
+from temp_dir_case import TempDirTestCase
+
+FILE_NAME = "GeneratedMD_SavingFiles"
+
+# Only the headers of this table are checked, so its values stay fixed
+HEADERS = ["Header 1", "Header 2", "Header 3", "Header 4"]
+TABLE_DF = DataFrame(np.zeros((6, 4), dtype=np.int64), columns=HEADERS)
+
+# Everything the saved json must mention
+JSON_TEXTS = (
+    "Section 1",
+    "Section 2",
+    "Section 3",
+    "Subsection 1",
+    "Subsection 2",
+    "Subsubsection 1",
+    "This is the first section.",
+    "This is the second section.",
+    "print('Hello, World!')",
+    "This is a subsection of the first section.",
+    "This is a subsubsection of the second subsection.",
+    "This is a random figure.",
+    "Item 1",
+    "Item 2",
+    "Item 3",
+    "https://www.google.com",
+    "Google",
+    "Check 1",
+    "Check 2",
+    "Check 3",
+    "Header 1",
+    "Header 2",
+    "Header 3",
+    "Header 4",
+    "Numpy Array Table",
+    "Python List Table",
+    "Pandas DataFrame Table",
+)
+
+
+class SavingFiles(TempDirTestCase):
     mdGen = None
 
-    def setup(self):
-        if self.mdGen is not None:
-            return
-        
-        mdGen = MDGenerator("/home/rlfowler/Documents/myprojects/PyMD/example", file_name='GeneratedMD', title="Generated Markdown", author="Author")
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        mdGen = MDGenerator(cls.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author")
         mdGen.add_text("Section 1", "This is the first section.")
         mdGen.add_text("Section 2", "This is the second section.")
         mdGen.add_code("Section 2", "print('Hello, World!')")
@@ -20,7 +61,6 @@ class SavingFiles(unittest.TestCase):
         mdGen.add_text("Section 1/Subsection 2/Subsubsection 1", "This is a subsubsection of the second subsection.")
 
         import matplotlib.pyplot as plt
-        import numpy as np
 
         # Generate random data
         x = np.linspace(0, 10, 100)
@@ -49,78 +89,100 @@ class SavingFiles(unittest.TestCase):
 
 
         # Add a table to the markdown file
-        headers = ["Header 1", "Header 2", "Header 3", "Header 4"]
         table = np.random.randint(0, 10, (6, 4))
-        df = DataFrame(table, columns=headers)
         
         list_table = ["Header 1", "Header 2", "Header 3"] + [str(3*i + j) for i in range(3) for j in range(3)]
         # mdGen.add_table("Section 3/Numpy Array Table", table)
         mdGen["Section 3"]["Numpy Array Table"].add_table(table)
         # mdGen.add_table("Section 3/Python List Table", list_table, 3, 4)
         mdGen["Section 3"]["Python List Table"].add_table(list_table, 3, 4)
-        # mdGen.add_table("Section 3/Pandas DataFrame Table", df)
-        mdGen["Section 3"]["Pandas DataFrame Table"].add_table(df)
+        # mdGen.add_table("Section 3/Pandas DataFrame Table", TABLE_DF)
+        mdGen["Section 3"]["Pandas DataFrame Table"].add_table(TABLE_DF)
 
-        # Save the markdown file
-        self.mdGen = mdGen
+        # Save the json file once for every test
+        mdGen.save_json()
+        cls.mdGen = mdGen
 
     def test_json(self):
-        self.setup()
-        self.mdGen.save_json()
-
-        with open("example/GeneratedMD.json", "r") as f:
-            data = f.read()
-            self.assertIn("Section 1", data)
-            self.assertIn("Section 2", data)
-            self.assertIn("Section 3", data)
-            self.assertIn("Subsection 1", data)
-            self.assertIn("Subsection 2", data)
-            self.assertIn("Subsubsection 1", data)
-            self.assertIn("This is the first section.", data)
-            self.assertIn("This is the second section.", data)
-            self.assertIn("print('Hello, World!')", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsubsection of the second subsection.", data)
-            self.assertIn("This is a random figure.", data)
-            self.assertIn("Item 1", data)
-            self.assertIn("Item 2", data)
-            self.assertIn("Item 3", data)
-            self.assertIn("https://www.google.com", data)
-            self.assertIn("Google", data)
-            self.assertIn("Check 1", data)
-            self.assertIn("Check 2", data)
-            self.assertIn("Check 3", data)
-            self.assertIn("Header 1", data)
-            self.assertIn("Header 2", data)
-            self.assertIn("Header 3", data)
-            self.assertIn("Header 4", data)
-            self.assertIn("Numpy Array Table", data)
-            self.assertIn("Python List Table", data)
-            self.assertIn("Pandas DataFrame Table", data)
-            self.assertIn("This is a random figure.", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsection of the first section.", data)
-            self.assertIn("This is a subsubsection of the second subsection.", data)
-            self.assertIn("This is a random figure.", data)
-            self.assertIn("Item 1", data)
-            self.assertIn("Item 2", data)
-            self.assertIn("Item 3", data)
-            self.assertIn("https://www.google.com", data)
-            self.assertIn("Google", data)
-            self.assertIn("Check 1", data)
-            self.assertIn("Check 2", data)
-            self.assertIn("Check 3", data)
-            self.assertIn("Header 1", data)
-            self.assertIn("Header 2", data)
+        data = (self.tmp / (FILE_NAME + ".json")).read_text()
+        self.assertListEqual([text for text in JSON_TEXTS if text not in data], [])
+
+    def test_compact_json(self):
+        self.mdGen.save_json(FILE_NAME + "_compact", compact=True)
+
+        indented = (self.mdGen.save_path / (FILE_NAME + ".json")).read_text()
+        compact = (self.mdGen.save_path / (FILE_NAME + "_compact.json")).read_text()
+        self.assertNotIn("\n", compact)
+        self.assertLess(len(compact), len(indented))
+        self.assertEqual(json.loads(indented), json.loads(compact))
+
+        mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author")
+        mdGen.load_json(FILE_NAME + "_compact")
+        self.assertListEqual(list(self.mdGen.section_headers), list(mdGen.section_headers))
+
+    def test_compact_unicode_json(self):
+        mdGen = MDGenerator(self.tmp, file_name='UnicodeMD', title="Generated Markdown", author="Author")
+        mdGen.add_text("Sección 1", "Température: 25 °C")
+        mdGen.save_json(compact=True)
+
+        self.assertIn("Température: 25 °C", (self.tmp / "UnicodeMD.json").read_text(encoding="utf-8"))
+
+        loaded = MDGenerator(self.tmp, file_name='UnicodeMD')
+        loaded.load_json()
+        self.assertEqual(loaded["Sección 1"]["text0"].text, "Température: 25 °C")
+
+    def test_shared_strings_json(self):
+        mdGen = MDGenerator(self.tmp, file_name='SharedMD', title="Generated Markdown", author="Author")
+        for i in range(3):
+            mdGen.add_text(f"Section {i}", "This text is repeated.")
+            mdGen.add_text(f"Section {i}", f"This text is unique {i}.")
+        mdGen.save_json(share_strings=True)
+
+        data = (self.tmp / "SharedMD.json").read_text()
+        self.assertEqual(data.count("This text is repeated."), 1)
+
+        loaded = MDGenerator(self.tmp, file_name='SharedMD')
+        loaded.load_json()
+        self.assertEqual(loaded["Section 2"]["text0"].text, "This text is repeated.")
+        self.assertEqual(loaded["Section 2"]["text1"].text, "This text is unique 2.")
+        self.assertIs(loaded["Section 0"]["text0"].text, loaded["Section 2"]["text0"].text)
+
+    def test_json_after_changes(self):
+        mdGen = MDGenerator(self.tmp, file_name='ChangedMD', title="Generated Markdown", author="Author")
+        text = mdGen.add_text("Section 1", "This is the first section.")
+        items = mdGen.add_list("Section 2/Subsection 1", ["Item 1"])
+        mdGen._to_json()
+
+        # Sections added, removed or changed in place after an earlier save are all saved again
+        text.text = "This is changed later."
+        items.items.append("Item 2")
+        mdGen.add_text("Section 2/Subsection 1", "This is added later.")
+        json_dict = mdGen._to_json()
+        self.assertEqual(json_dict["Section 1"]["text0"]["text"], "This is changed later.")
+        self.assertListEqual(json_dict["Section 2"]["Subsection 1"]["list0"]["items"], ["Item 1", "Item 2"])
+        self.assertIn("text0", json_dict["Section 2"]["Subsection 1"])
+
+        del mdGen["Section 2"]["Subsection 1"]
+        self.assertDictEqual(mdGen._to_json()["Section 2"], {})
+
+    def test_load_top_level_json(self):
+        mdGen = MDGenerator(self.tmp, file_name='TopLevelMD', title="Generated Markdown", author="Author")
+        mdGen.add_text(None, "This is not in a section.")
+        mdGen.add_code(None, "print('Hello, World!')")
+        mdGen.add_list(None, ["Item 1", "Item 2"])
+        mdGen.add_checkbox(None, ["Task 1", "Task 2"], [True, False])
+        mdGen.add_text("Section 1", "This is the first section.")
+        mdGen.save_json()
+
+        loaded = MDGenerator(self.tmp, file_name='TopLevelMD', title="Generated Markdown", author="Author")
+        loaded.load_json()
+        self.assertDictEqual(mdGen._to_json(), loaded._to_json())
 
     def test_load_json(self):
-        self.setup()
-        self.mdGen.save_json()
-        mdGen = MDGenerator("/home/rlfowler/Documents/myprojects/PyMD/example", file_name='GeneratedMD', title="Generated Markdown", author="Author")
+        mdGen = MDGenerator(self.tmp, file_name=FILE_NAME, title="Generated Markdown", author="Author")
         mdGen.load_json()
 
-        self.assertListEqual(self.mdGen.section_headers, mdGen.section_headers)
+        self.assertListEqual(list(self.mdGen.section_headers), list(mdGen.section_headers))
         self.assertDictEqual(self.mdGen.section_type_count, mdGen.section_type_count)
 
 